@@ -1,12 +1,65 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import time
+
+START_TIME = time.perf_counter()
+
+import argparse
 
 import pyglet
+from game.board import BOARD_WIDTH, BOARD_HEIGHT
 from game.game_window import GameWindow
 
 
+def board_size(text):
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected WxH, e.g. 10x20')
+    if width < 4 or height < 4:
+        raise argparse.ArgumentTypeError('the board needs at least 4x4 cells')
+    return width, height
+
+
 def main():
-    game_window = GameWindow(800, 600)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connect', metavar='ADDRESS',
+                        help='play on a game server, host:port or a Unix '
+                             'socket path (see python -m game.server)')
+    parser.add_argument('--fullscreen', action='store_true',
+                        help='fill the screen, the layout scales with it')
+    parser.add_argument('--das', type=float, default=0.167, metavar='SECONDS',
+                        help='hold time before a move key repeats')
+    parser.add_argument('--arr', type=float, default=0.033, metavar='SECONDS',
+                        help='time between repeats of a held move key')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='write per-phase frame timings here on exit')
+    parser.add_argument('--shader-board', action='store_true',
+                        help='draw the playfield with the GLSL renderer')
+    parser.add_argument('--replay-dir', metavar='DIR',
+                        help='save a replay of every game here')
+    parser.add_argument('--tick-rate', type=int, default=60,
+                        help='game ticks per second')
+    parser.add_argument('--board', type=board_size,
+                        default=(BOARD_WIDTH, BOARD_HEIGHT), metavar='WxH',
+                        help='playfield size in cells, e.g. 100x200 with '
+                             '--shader-board')
+    args = parser.parse_args()
+    if args.board != (BOARD_WIDTH, BOARD_HEIGHT) and (args.connect
+                                                      or args.replay_dir):
+        # server states and replays hold the standard board
+        parser.error('--board cannot be used with --connect or --replay-dir')
+    # a size given with fullscreen would change the screen mode
+    size = () if args.fullscreen else (800, 600)
+    game_window = GameWindow(*size, start_time=START_TIME,
+                             server=args.connect, resizable=True,
+                             fullscreen=args.fullscreen,
+                             das=args.das, arr=args.arr,
+                             profile_path=args.profile,
+                             shader_board=args.shader_board,
+                             replay_dir=args.replay_dir,
+                             tick_rate=args.tick_rate,
+                             board_size=args.board)
     game_window.set_caption('Tetris Game')
     pyglet.app.run()
 
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+import collections
+import concurrent.futures
+import multiprocessing
+import sys
+import time
+
+from game import engine
+from game.board import BOARD_WIDTH, BOARD_HEIGHT
+from game.shapes import ROTATIONS
+
+# ''' placement search
+# Boards are tuples of row bitmasks, bit x = column x, row 0 at the bottom,
+# so they are cheap to copy and can key the transposition cache. A
+# placement is (rotation, x): turn the new piece at the spawn position, move
+# it to column x and hard drop it. Every reachable placement of the current
+# piece is scored by the heuristic, then, time allowing, refined with the
+# best placement of the next piece on the resulting board.
+# '''
+
+FULL_ROW = (1 << BOARD_WIDTH) - 1
+SPAWN_X, SPAWN_Y = 4, 18
+
+
+def distinct_rotations(shape):
+    # the square has one distinct rotation, the bar and both Ns two; turns
+    # move the cells around the pivot, so they are compared by their shape
+    # from the bounding box corner, and the lowest rotation of each is kept
+    seen = set()
+    for piece in ROTATIONS[shape]:
+        cells = frozenset((dx - piece.min_x, dy - piece.min_y)
+                          for dx, dy in piece.cells)
+        if cells not in seen:
+            seen.add(cells)
+            yield piece
+
+
+DISTINCT_ROTATIONS = [tuple(distinct_rotations(shape))
+                      for shape in range(len(ROTATIONS))]
+
+
+def board_rows(board):
+    rows = getattr(board, 'rows', None)
+    if rows is not None:
+        return tuple(rows)
+    return tuple(sum(1 << x for x in range(board.width) if board.get(x, y))
+                 for y in range(board.height))
+
+
+def collides(rows, x, y, piece):
+    shift = x + piece.min_x
+    if shift < 0 or x + piece.max_x >= BOARD_WIDTH:
+        return True
+    for dy, mask in piece.row_masks:
+        row_y = y + dy
+        if row_y < 0 or (row_y < BOARD_HEIGHT and rows[row_y] & mask << shift):
+            return True
+    return False
+
+
+def column_heights(rows):
+    heights = [0] * BOARD_WIDTH
+    seen = 0
+    for y in range(BOARD_HEIGHT - 1, -1, -1):
+        new = rows[y] & ~seen
+        if new:
+            seen |= new
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = y + 1
+                new ^= low
+            if seen == FULL_ROW:
+                break
+    return heights
+
+
+def placements(rows, shape):
+    # (rotation, x, rows after the drop and clear, lines cleared) for every
+    # placement that is reachable from the spawn and does not end the game
+    heights = column_heights(rows)
+    for piece in DISTINCT_ROTATIONS[shape]:
+        # every turn up to this rotation has to fit at the spawn
+        if any(collides(rows, SPAWN_X, SPAWN_Y, ROTATIONS[shape][r])
+               for r in range(piece.rotation + 1)):
+            continue
+        lo = SPAWN_X
+        while not collides(rows, lo - 1, SPAWN_Y, piece):
+            lo -= 1
+        hi = SPAWN_X
+        while not collides(rows, hi + 1, SPAWN_Y, piece):
+            hi += 1
+        for x in range(lo, hi + 1):
+            y = max(heights[x + dx] - dy for dx, dy in piece.bottom)
+            if y + piece.max_y >= BOARD_HEIGHT - 1:
+                # locking into the top row ends the game
+                continue
+            new = list(rows)
+            for dy, mask in piece.row_masks:
+                new[y + dy] |= mask << (x + piece.min_x)
+            kept = [row for row in new if row != FULL_ROW]
+            lines = BOARD_HEIGHT - len(kept)
+            if lines:
+                kept.extend([0] * lines)
+            yield piece.rotation, x, tuple(kept), lines
+
+
+# weighted sum of aggregate column height, covered holes, bumpiness (height
+# difference of neighbouring columns) and lines cleared; higher is better
+class Heuristic(object):
+
+    def __init__(self, height=-0.510066, lines=0.760666, holes=-0.35663,
+                 bumpiness=-0.184483):
+        self.height = height
+        self.lines = lines
+        self.holes = holes
+        self.bumpiness = bumpiness
+
+    def __call__(self, rows, lines):
+        heights = column_heights(rows)
+        total = sum(heights)
+        filled = sum(bin(row).count('1') for row in rows)
+        bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+        return (self.height * total + self.holes * (total - filled)
+                + self.bumpiness * bumpiness + self.lines * lines)
+
+
+class LRUCache(object):
+
+    def __init__(self, size):
+        self.size = size
+        self.data = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        if len(self.data) > self.size:
+            self.data.popitem(last=False)
+
+
+class Search(object):
+
+    def __init__(self, heuristic, cache_size):
+        self.heuristic = heuristic
+        self.cache = LRUCache(cache_size)
+
+    def best_value(self, rows, shape):
+        # value of the best placement of `shape`; the transposition cache
+        # is keyed by board and shape, as boards recur after line clears
+        key = (rows, shape)
+        value = self.cache.get(key)
+        if value is None:
+            value = max((self.heuristic(new, lines)
+                         for _, _, new, lines in placements(rows, shape)),
+                        default=float('-inf'))
+            self.cache.put(key, value)
+        return value
+
+    def lookahead(self, rows, lines, next_shape):
+        return self.heuristic.lines * lines + self.best_value(rows, next_shape)
+
+
+# each pool worker keeps its own Search, and with it its own cache, and
+# reads the search generation of the piece being decided
+_worker_search = None
+_worker_generation = None
+
+
+def init_worker(heuristic, cache_size, generation):
+    global _worker_search, _worker_generation
+    _worker_search = Search(heuristic, cache_size)
+    _worker_generation = generation
+
+
+def lookahead_task(generation, rows, lines, next_shape):
+    # tasks left over from an earlier piece return at once, without a value
+    if _worker_generation.value != generation:
+        return None
+    return _worker_search.lookahead(rows, lines, next_shape)
+
+
+# picks a placement for every new piece and feeds it to the game one
+# action per tick. choose() spends at most `budget` seconds: all one-piece
+# placements are scored first, then refined with the next piece in order
+# of promise until the budget runs out; with workers > 0 the refinement is
+# spread over a process pool
+class AutoPlayer(object):
+
+    def __init__(self, heuristic=None, lookahead=True, budget=0.02,
+                 cache_size=200000, workers=0):
+        self.heuristic = heuristic or Heuristic()
+        self.use_lookahead = lookahead
+        self.budget = budget
+        self.search = Search(self.heuristic, cache_size)
+        self.workers = workers
+        self.pool = None
+        self.generation = 0
+        if workers:
+            self.shared_generation = multiprocessing.RawValue('q', 0)
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=init_worker,
+                initargs=(self.heuristic, cache_size, self.shared_generation))
+        self.piece = None
+        self.actions = collections.deque()
+        self.moves = 0
+        self.refined = 0
+        self.candidates = 0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def choose(self, rows, shape, next_shape=None):
+        # (rotation, x) of the best placement, None when every placement
+        # ends the game
+        deadline = time.perf_counter() + self.budget
+        scored = sorted(((self.heuristic(new, lines), rotation, x, new, lines)
+                         for rotation, x, new, lines in placements(rows, shape)),
+                        reverse=True)
+        if not scored:
+            return None
+        self.moves += 1
+        self.candidates += len(scored)
+        if not self.use_lookahead or next_shape is None:
+            return scored[0][1:3]
+        if self.pool is not None:
+            values = self.refine_parallel(scored, next_shape, deadline)
+        else:
+            values = [None] * len(scored)
+            for i, (_, _, _, new, lines) in enumerate(scored):
+                if i and time.perf_counter() >= deadline:
+                    break
+                values[i] = self.search.lookahead(new, lines, next_shape)
+        # 2-ply values only compete with each other, never with the 1-ply
+        # scores of moves that were not refined
+        refined = [i for i, value in enumerate(values) if value is not None]
+        self.refined += len(refined)
+        if not refined:
+            return scored[0][1:3]
+        best = max(refined, key=values.__getitem__)
+        if values[best] == float('-inf'):
+            # no next piece fits after any refined move, keep the 1-ply pick
+            best = 0
+        return scored[best][1:3]
+
+    def refine_parallel(self, scored, next_shape, deadline):
+        # one task per move, in order of promise; moving the generation on
+        # turns the tasks of the previous piece still in the pool into no-ops
+        self.generation += 1
+        self.shared_generation.value = self.generation
+        futures = [self.pool.submit(lookahead_task, self.generation, new,
+                                    lines, next_shape)
+                   for _, _, _, new, lines in scored]
+        done, _ = concurrent.futures.wait(
+            futures, timeout=max(0.0, deadline - time.perf_counter()))
+        values = []
+        for future in futures:
+            if future in done:
+                values.append(future.result())
+            else:
+                future.cancel()
+                values.append(None)
+        return values
+
+    def plan(self, game):
+        move = self.choose(board_rows(game.board), game.player_piece.shape,
+                           game.next_shape)
+        if move is None:
+            return [engine.DROP]
+        rotation, x = move
+        dx = x - game.player_pos[0]
+        step = engine.RIGHT if dx > 0 else engine.LEFT
+        return [engine.ROTATE] * rotation + [step] * abs(dx) + [engine.DROP]
+
+    def act(self, game):
+        # the action for this tick; a new plan is made for every new piece
+        if not game.player_control:
+            return engine.NOOP
+        if game.pieces != self.piece:
+            self.piece = game.pieces
+            self.actions = collections.deque(self.plan(game))
+        return self.actions.popleft() if self.actions else engine.NOOP
+
+
+def play(player, seed=0, max_pieces=None):
+    # one headless game, returns the finished engine
+    game = engine.TetrisEngine(seed=seed)
+    while not game.show_game_over_label:
+        if max_pieces is not None and game.pieces >= max_pieces:
+            break
+        game.step(player.act(game))
+        game.events = []
+    return game
+
+
+def main(argv):
+    games = int(argv[0]) if argv else 3
+    max_pieces = int(argv[1]) if len(argv) > 1 else 500
+    player = AutoPlayer()
+    for seed in range(games):
+        start = time.perf_counter()
+        moves = player.moves
+        game = play(player, seed, max_pieces)
+        elapsed = time.perf_counter() - start
+        print('seed {} pieces {} score {} level {} {:.2f} ms/piece'.format(
+            seed, game.pieces, game.target_score, game.level,
+            elapsed * 1000 / max(player.moves - moves, 1)))
+    cache = player.search.cache
+    print('cache hit rate {:.1%}, {:.1f} of {:.1f} candidates refined'.format(
+        cache.hits / max(cache.hits + cache.misses, 1),
+        player.refined / max(player.moves, 1),
+        player.candidates / max(player.moves, 1)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
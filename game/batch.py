@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from game import engine
+from game.replay import Replay
+
+# ''' output
+# one JSON object per finished game, in completion order:
+#   {"policy", "seed", "score", "level", "lines", "pieces", "ticks",
+#    "game_seconds", "truncated", "seconds"} (+ "replay" for replays)
+# then one {"summary": {...}} line with throughput and score statistics
+# '''
+
+POLICIES = ('random', 'ai', 'replay')
+
+# engine attributes that --set may override, see TetrisEngine.__init__
+TUNABLE = ('level_score', 'level_score_step', 'fall_time', 'fall_time_step',
+           'min_fall_time', 'basic_score', 'full_line_score')
+
+# per worker process, so the AI's transposition cache is reused by every
+# game the worker runs
+_autoplayer = None
+
+
+def make_game(seed, overrides):
+    game = engine.TetrisEngine(seed=seed)
+    if overrides:
+        for name, value in overrides.items():
+            setattr(game, name, value)
+        # the level curve is read by restart()
+        game.restart(seed)
+    return game
+
+
+def run_game(job):
+    policy, seed, path, options = job
+    start = time.perf_counter()
+    if policy == 'replay':
+        replay = Replay.load(path)
+        seed = replay.seed
+        game = make_game(seed, options['overrides'])
+        game.tick = replay.tick
+        replay.play(game=game)
+        truncated = False
+    else:
+        game = make_game(seed, options['overrides'])
+        if policy == 'ai':
+            global _autoplayer
+            if _autoplayer is None:
+                from game.ai import AutoPlayer
+                _autoplayer = AutoPlayer(budget=options['budget'])
+            act = _autoplayer.act
+        else:
+            rng = random.Random('policy-{}'.format(seed))
+            act = lambda game: rng.choice(engine.ACTIONS)
+        max_pieces = options['max_pieces']
+        max_ticks = options['max_ticks']
+        truncated = False
+        while not game.show_game_over_label:
+            if (max_pieces and game.pieces >= max_pieces
+                    or max_ticks and game.ticks >= max_ticks):
+                truncated = True
+                break
+            game.step(act(game))
+    result = {
+        'policy': policy,
+        'seed': seed,
+        'score': game.target_score,
+        'level': game.level,
+        'lines': game.lines,
+        'pieces': game.pieces,
+        'ticks': game.ticks,
+        'game_seconds': game.ticks * game.tick,
+        'truncated': truncated,
+        'seconds': time.perf_counter() - start,
+    }
+    if path:
+        result['replay'] = path
+    return result
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+def summarize(results, elapsed, workers):
+    ticks = sum(r['ticks'] for r in results)
+    summary = {
+        'games': len(results),
+        'workers': workers,
+        'seconds': elapsed,
+        'games_per_second': len(results) / elapsed,
+        'ticks_per_second': ticks / elapsed,
+        # simulated game time per wall second
+        'speedup': sum(r['game_seconds'] for r in results) / elapsed,
+        'truncated': sum(r['truncated'] for r in results),
+        'levels': {},
+    }
+    for name in ('score', 'level', 'lines', 'pieces', 'ticks'):
+        values = [r[name] for r in results]
+        summary[name] = {
+            'mean': sum(values) / float(len(values)),
+            'min': min(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'max': max(values),
+        }
+    for r in results:
+        level = str(r['level'])
+        summary['levels'][level] = summary['levels'].get(level, 0) + 1
+    return summary
+
+
+def parse_override(text):
+    name, _, value = text.partition('=')
+    if name not in TUNABLE or not value:
+        raise argparse.ArgumentTypeError(
+            'expected NAME=VALUE with NAME one of ' + ', '.join(TUNABLE))
+    return name, float(value) if '.' in value else int(value)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m game.batch',
+        description='run seeded games headless and stream JSON lines')
+    parser.add_argument('-n', '--games', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='first seed, game i uses seed + i')
+    parser.add_argument('-p', '--policy', choices=POLICIES, default='random')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help='processes, default one per core')
+    parser.add_argument('--max-pieces', type=int, default=2000,
+                        help='stop a game after this many pieces, 0 for no limit')
+    parser.add_argument('--max-ticks', type=int, default=0)
+    parser.add_argument('--budget', type=float, default=float('inf'),
+                        help='AI seconds per piece; the default searches '
+                             'fully, which keeps results reproducible')
+    parser.add_argument('--set', dest='overrides', action='append', default=[],
+                        type=parse_override, metavar='NAME=VALUE',
+                        help='override a level curve or score parameter')
+    parser.add_argument('replays', nargs='*', help='replay files for -p replay')
+    args = parser.parse_args(argv)
+
+    options = {
+        'overrides': dict(args.overrides),
+        'max_pieces': args.max_pieces,
+        'max_ticks': args.max_ticks,
+        'budget': args.budget,
+    }
+    if args.policy == 'replay':
+        if not args.replays:
+            parser.error('-p replay needs replay files')
+        jobs = [('replay', None, path, options) for path in args.replays]
+    else:
+        jobs = [(args.policy, args.seed + i, None, options)
+                for i in range(args.games)]
+    workers = max(1, min(args.workers or 1, len(jobs)))
+
+    results = []
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(run_game, jobs):
+            results.append(result)
+            sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+            sys.stdout.flush()
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    if results:
+        print(json.dumps({'summary': summarize(results, elapsed, workers)},
+                         sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+import argparse
+import copy
+import json
+import platform
+import random
+import sys
+import time
+
+from game import engine
+from game.board import BOARD_WIDTH, BOARD_HEIGHT, BitBoard, ListBoard
+
+BOARD_FILLS = (('empty', 0), ('half', 10), ('nearly_full', 16))
+BLOCK_SIZES = (16, 32, 64, 128)
+
+
+def measure(fn, number=1000, repeat=5):
+    # best of `repeat` runs, in seconds per call
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure_each(make, fn, number=200, repeat=5):
+    # like measure() for calls that consume their input, which is built by
+    # make() outside of the timed loop
+    best = None
+    for _ in range(repeat):
+        items = [make() for _ in range(number)]
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def filled_game(rows, board_class=BitBoard, seed=0):
+    # a game whose bottom rows are filled with one random hole each, so no
+    # row is full and the player piece is still at the top
+    game = engine.TetrisEngine(board_class=board_class, seed=seed)
+    rng = random.Random(seed)
+    for y in range(rows):
+        hole = rng.randrange(BOARD_WIDTH)
+        for x in range(BOARD_WIDTH):
+            if x != hole:
+                game.board.set(x, y, rng.randint(1, 4))
+    return game
+
+
+def bench_engine(results, board_class):
+    prefix = 'engine.{}.'.format(board_class.__name__)
+    for name, rows in BOARD_FILLS:
+        game = filled_game(rows, board_class)
+        start_y = game.player_pos[1]
+
+        def check_down():
+            game.player_pos[1] = start_y
+            game.check_down()
+        results[prefix + 'check_down.' + name] = measure(check_down)
+        results[prefix + 'check_rotate.' + name] = measure(game.check_rotate)
+        results[prefix + 'check_full_lines.' + name] = measure(
+            lambda: game.check_full_lines(0, BOARD_HEIGHT - 1))
+        results[prefix + 'direct_down.' + name] = measure_each(
+            lambda: copy.deepcopy(game), lambda g: g.direct_down())
+
+    def full_board():
+        board = filled_game(12, board_class).board
+        for y in (2, 5, 6, 11):
+            board.fill_row(y, 5)
+        return board
+    results[prefix + 'clear_rows.4'] = measure_each(
+        full_board, lambda board: board.clear_rows([2, 5, 6, 11]))
+
+
+def bench_games(results, games=200, seed=0):
+    # full seeded games of random play, stepped one tick at a time
+    rng = random.Random(seed)
+    ticks = 0
+    start = time.perf_counter()
+    for i in range(games):
+        game = engine.TetrisEngine(seed=seed + i)
+        while not game.show_game_over_label:
+            game.step(rng.choice(engine.ACTIONS))
+        ticks += game.ticks
+    elapsed = time.perf_counter() - start
+    results['games.random.seconds_per_game'] = elapsed / games
+    results['games.random.seconds_per_tick'] = elapsed / ticks
+
+
+def import_pyglet():
+    try:
+        import pyglet
+    except ImportError:
+        return None
+    # no hidden shadow window, so importing pyglet.image works without X
+    pyglet.options['shadow_window'] = False
+    return pyglet
+
+
+def bench_blocks(results, skipped):
+    if import_pyglet() is None:
+        skipped.append('blocks: pyglet is not installed')
+        return
+    from game import blocks
+    colors = blocks.COLORS + [blocks.darken_color(blocks.darken_color(color))
+                              for color in blocks.COLORS]
+    for size in BLOCK_SIZES:
+        pattern = blocks.BlockImagePattern(blocks.RED)
+        results['blocks.create_image.{}'.format(size)] = measure(
+            lambda: pattern.create_image(size, size), number=20)
+        results['blocks.atlas_data.{}'.format(size)] = measure(
+            lambda: blocks.atlas_data(colors, size), number=20)
+
+
+def bench_draw(results, skipped):
+    # needs an X display; LIBGL_ALWAYS_SOFTWARE=1 selects llvmpipe
+    pyglet = import_pyglet()
+    if pyglet is None:
+        skipped.append('draw: pyglet is not installed')
+        return
+    try:
+        window = pyglet.window.Window(800, 600, visible=False)
+    except Exception as e:
+        skipped.append('draw: no GL context ({})'.format(e.__class__.__name__))
+        return
+    from game import blocks
+    from game.sprite_renderer import SpriteBoardRenderer
+    try:
+        block_size = 20
+        images = blocks.block_images(blocks.COLORS * 2, block_size)
+        for name, rows in BOARD_FILLS:
+            batch = pyglet.graphics.Batch()
+            renderer = SpriteBoardRenderer(batch, images[:8], images[8:])
+            renderer.layout(200, 80, block_size, 480, 460)
+            game = filled_game(rows)
+            renderer.update(game)
+
+            def draw_board():
+                # a full refresh, then the frame itself
+                renderer.board = None
+                renderer.update_board(game.board)
+                window.clear()
+                batch.draw()
+                pyglet.gl.glFinish()
+
+            def draw_frame():
+                renderer.update(game)
+                window.clear()
+                batch.draw()
+                pyglet.gl.glFinish()
+            results['draw.draw_board.' + name] = measure(draw_board, number=50)
+            results['draw.frame.' + name] = measure(draw_frame, number=50)
+    finally:
+        window.close()
+
+
+def run(selected):
+    results = {}
+    skipped = []
+    if 'engine' in selected:
+        bench_engine(results, BitBoard)
+        bench_engine(results, ListBoard)
+    if 'games' in selected:
+        bench_games(results)
+    if 'blocks' in selected:
+        bench_blocks(results, skipped)
+    if 'draw' in selected:
+        bench_draw(results, skipped)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(old, new):
+    # seconds per call of both files and the new/old ratio
+    names = sorted(set(old['results']) | set(new['results']))
+    width = max(len(name) for name in names) if names else 0
+    for name in names:
+        a = old['results'].get(name)
+        b = new['results'].get(name)
+        ratio = '{:7.2f}x'.format(b / a) if a and b else '       -'
+        print('{:<{}} {:>12} {:>12} {}'.format(
+            name, width, '{:.3e}'.format(a) if a else '-',
+            '{:.3e}'.format(b) if b else '-', ratio))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m game.benchmark')
+    sub = parser.add_subparsers(dest='command')
+    run_parser = sub.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('-o', '--output', help='write results as JSON')
+    run_parser.add_argument('--only', nargs='+',
+                            default=['engine', 'games', 'blocks', 'draw'],
+                            choices=['engine', 'games', 'blocks', 'draw'])
+    compare_parser = sub.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        compare(old, new)
+    elif args.command == 'run':
+        report = run(args.only)
+        for name, seconds in sorted(report['results'].items()):
+            print('{:<48} {:.3e} s'.format(name, seconds))
+        for reason in report['skipped']:
+            print('skipped ' + reason)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import os
+import zlib
+
+from pyglet.image import ImagePattern, ImageData
+
+
+BLACK = (0.2, 0.2, 0.2, 1.0)      # color 0
+RED = (1.0, 0.5, 0.5, 1.0)        # color 1
+GREEN = (0.5, 1.0, 0.5, 1.0)      # color 2
+BLUE = (0.5, 0.5, 1.0, 1.0)       # color 3
+YELLOW = (0.8, 0.8, 0.5, 1.0)     # color 4
+GREY = (0.7, 0.7, 0.7, 1.0)       # color 5
+DARK_GREY = (0.5, 0.5, 0.5, 1.0)  # color 6
+WHITE = (0.9, 0.9, 0.9, 1.0)      # color 7
+
+COLORS = [BLACK, RED, GREEN, BLUE, YELLOW, GREY, DARK_GREY, WHITE]
+
+ATLAS_COLUMNS = 8
+
+
+def int_color(float_color):
+    return tuple(map(lambda c: int(c*255), float_color))
+
+
+def lighten_color(float_color):
+    return tuple(map(lambda c: min(c*1.2, 1.0), float_color))
+
+
+def darken_color(float_color):
+    return tuple(map(lambda c: c*0.8, float_color))
+
+
+def block_rows(float_color, width):
+    # the three distinct pixel rows of a block: bottom edge, middle, top edge
+    color = bytes(int_color(float_color))
+    light = bytes(int_color(lighten_color(float_color)))
+    dark = bytes(int_color(darken_color(float_color)))
+    left = [pos_x / width <= 0.08 for pos_x in range(width)]
+    right = [pos_x / width >= 0.92 for pos_x in range(width)]
+    bottom = b''.join(light if left[x] else dark for x in range(width))
+    middle = b''.join(light if left[x] else dark if right[x] else color
+                      for x in range(width))
+    top = light * width
+    return bottom, middle, top
+
+
+def block_row_kinds(height):
+    # index into block_rows() for every pixel row, bottom to top
+    kinds = []
+    for pos_y in range(height):
+        if pos_y / height <= 0.08:
+            kinds.append(0)
+        elif pos_y / height >= 0.92:
+            kinds.append(2)
+        else:
+            kinds.append(1)
+    return kinds
+
+
+def block_data(float_color, width, height):
+    rows = block_rows(float_color, width)
+    return b''.join(rows[kind] for kind in block_row_kinds(height))
+
+
+def atlas_data(colors, size, columns=ATLAS_COLUMNS):
+    # size x size blocks, one per color, left to right then bottom to top;
+    # the last row is padded with empty blocks
+    blocks = [block_rows(color, size) for color in colors]
+    blank = (b'\0' * 4 * size,) * 3
+    blocks += [blank] * (-len(blocks) % columns)
+    kinds = block_row_kinds(size)
+    return b''.join(b''.join(block[kind] for block in blocks[i:i + columns])
+                    for i in range(0, len(blocks), columns)
+                    for kind in kinds)
+
+
+class BlockImagePattern(ImagePattern):
+    def __init__(self, color):
+        self.float_color = color
+        self.color = int_color(color)
+        self.light_color = int_color(lighten_color(color))
+        self.dark_color = int_color(darken_color(color))
+
+    def create_image(self, width, height):
+        return ImageData(width, height, 'RGBA',
+                         block_data(self.float_color, width, height))
+
+
+_atlases = {}
+
+
+def load_atlas_data(colors, size, cache_dir=None):
+    # the RGBA bytes of the atlas, read from or written to cache_dir if
+    # given; touches no GL state, so it can run on a loader thread
+    size = int(size)
+    path = None
+    rows = -(-len(colors) // ATLAS_COLUMNS)
+    if cache_dir:
+        key = (size, tuple(colors))
+        path = os.path.join(cache_dir, 'blocks-{}-{:08x}.rgba'.format(
+            size, zlib.crc32(repr(key).encode())))
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) == rows * ATLAS_COLUMNS * size * size * 4:
+                return data
+    data = atlas_data(colors, size)
+    if path:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return data
+
+
+def block_images(colors, size, cache_dir=None, data=None):
+    # one texture region per color, all cut from a single atlas texture that
+    # is cached per size in memory and, given cache_dir, on disk; data is the
+    # output of load_atlas_data() when that already ran elsewhere
+    size = int(size)
+    key = (size, tuple(colors))
+    if key not in _atlases:
+        if data is None:
+            data = load_atlas_data(colors, size, cache_dir)
+        rows = -(-len(colors) // ATLAS_COLUMNS)
+        texture = ImageData(ATLAS_COLUMNS * size, rows * size, 'RGBA',
+                            data).get_texture()
+        _atlases[key] = [texture.get_region(i % ATLAS_COLUMNS * size,
+                                            i // ATLAS_COLUMNS * size,
+                                            size, size)
+                         for i in range(len(colors))]
+    return _atlases[key]
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+BOARD_WIDTH = 10
+BOARD_HEIGHT = 20
+
+def drop_distance(board, x, y, piece):
+    # rows the piece can fall, from the skyline alone; None when a column of
+    # the piece is already below the skyline (tucked under an overhang)
+    heights = board.heights
+    distance = board.height
+    for dx, dy in piece.bottom:
+        gap = y + dy - heights[x + dx]
+        if gap < 0:
+            return None
+        distance = min(distance, gap)
+    return distance
+
+
+# reference backend, one color int per cell in a flat list
+class ListBoard(object):
+
+    def __init__(self, width=BOARD_WIDTH, height=BOARD_HEIGHT):
+        self.width = width
+        self.height = height
+        self.data = [0 for _ in range(width * height)]
+        # skyline, one past the highest occupied cell of every column
+        self.heights = [0] * width
+        # rows changed since the renderer last looked
+        self.dirty_rows = set(range(height))
+
+    def get(self, x, y):
+        return self.data[x + y * self.width]
+
+    def set(self, x, y, color):
+        self.data[x + y * self.width] = color
+        self.dirty_rows.add(y)
+        if color:
+            self.heights[x] = max(self.heights[x], y + 1)
+        elif y + 1 == self.heights[x]:
+            self.lower_height(x)
+
+    def place(self, x, y, piece, color):
+        # locks a piece in, like set() for each of its cells
+        for dx, dy in piece.cells:
+            self.set(x + dx, y + dy, color)
+
+    def lower_height(self, x):
+        h = min(self.heights[x], self.height)
+        while h > 0 and self.data[x + (h - 1) * self.width] == 0:
+            h -= 1
+        self.heights[x] = h
+
+    def collides(self, x, y, piece):
+        for pos in piece.cells:
+            pos_x = x + pos[0]
+            pos_y = y + pos[1]
+            if pos_x < 0 or pos_x >= self.width or pos_y < 0 \
+                    or self.data[pos_x + pos_y * self.width] != 0:
+                return True
+        return False
+
+    def row_colors(self, y):
+        return bytes(self.data[y * self.width:(y + 1) * self.width])
+
+    def is_full(self, y):
+        return 0 not in self.data[y * self.width:(y + 1) * self.width]
+
+    def row_occupied(self, y):
+        return any(self.data[y * self.width:(y + 1) * self.width])
+
+    def fill_row(self, y, color):
+        self.dirty_rows.add(y)
+        for x in range(self.width):
+            self.data[x + y * self.width] = color
+            self.heights[x] = max(self.heights[x], y + 1)
+
+    def recolor_row(self, y, color):
+        self.dirty_rows.add(y)
+        for x in range(self.width):
+            if self.data[x + y * self.width] != 0:
+                self.data[x + y * self.width] = color
+
+    def clear_rows(self, rows):
+        self.dirty_rows.update(range(min(rows), self.height))
+        for y in sorted(rows, reverse=True):
+            del self.data[y * self.width:(y + 1) * self.width]
+        self.data.extend(0 for _ in range(len(rows) * self.width))
+        for x in range(self.width):
+            self.lower_height(x)
+
+    def pop_dirty_rows(self):
+        rows = self.dirty_rows
+        self.dirty_rows = set()
+        return rows
+
+    def snapshot(self):
+        # same format as BitBoard.snapshot(), built by copying every cell
+        rows = []
+        colors = []
+        for y in range(self.height):
+            row = self.data[y * self.width:(y + 1) * self.width]
+            rows.append(sum(1 << x for x, color in enumerate(row) if color))
+            colors.append(bytes(row))
+        return tuple(rows), tuple(colors), tuple(self.heights)
+
+    def restore(self, snapshot):
+        _, colors, heights = snapshot
+        self.data = [color for row in colors for color in row]
+        self.heights = list(heights)
+        self.dirty_rows = set(range(self.height))
+
+    def cells(self):
+        for i, v in enumerate(self.data):
+            if v != 0:
+                yield i % self.width, i // self.width, v
+
+
+# one occupancy bitmask per row (bit x is column x) plus a color array
+class BitBoard(object):
+
+    def __init__(self, width=BOARD_WIDTH, height=BOARD_HEIGHT):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        self.rows = [0] * height
+        self.colors = [bytearray(width) for _ in range(height)]
+        # bit y is set while colors[y] is shared with a snapshot; the row
+        # is copied before its next write
+        self.shared = 0
+        # skyline, one past the highest occupied cell of every column
+        self.heights = [0] * width
+        # rows changed since the renderer last looked
+        self.dirty_rows = set(range(height))
+
+    def get(self, x, y):
+        return self.colors[y][x]
+
+    def set(self, x, y, color):
+        if self.shared >> y & 1:
+            self.own_row(y)
+        self.colors[y][x] = color
+        self.dirty_rows.add(y)
+        if color:
+            self.rows[y] |= 1 << x
+            if y >= self.heights[x]:
+                self.heights[x] = y + 1
+        else:
+            self.rows[y] &= ~(1 << x)
+            if y + 1 == self.heights[x]:
+                self.lower_height(x)
+
+    def place(self, x, y, piece, color):
+        # locks a piece in with one mask write per row it covers
+        shift = x + piece.min_x
+        rows = self.rows
+        colors = self.colors
+        dirty = self.dirty_rows
+        shared = self.shared
+        for dy, mask in piece.row_masks:
+            row_y = y + dy
+            if shared >> row_y & 1:
+                self.own_row(row_y)
+            rows[row_y] |= mask << shift
+            dirty.add(row_y)
+        heights = self.heights
+        for dx, dy in piece.cells:
+            colors[y + dy][x + dx] = color
+            if y + dy >= heights[x + dx]:
+                heights[x + dx] = y + dy + 1
+
+    def lower_height(self, x):
+        h = min(self.heights[x], self.height)
+        while h > 0 and not self.rows[h - 1] >> x & 1:
+            h -= 1
+        self.heights[x] = h
+
+    def collides(self, x, y, piece):
+        shift = x + piece.min_x
+        if shift < 0 or x + piece.max_x >= self.width or y + piece.min_y < 0:
+            return True
+        rows = self.rows
+        for dy, mask in piece.row_masks:
+            if rows[y + dy] & (mask << shift):
+                return True
+        return False
+
+    def row_colors(self, y):
+        return bytes(self.colors[y])
+
+    def is_full(self, y):
+        return self.rows[y] == self.full_row
+
+    def row_occupied(self, y):
+        return self.rows[y] != 0
+
+    def fill_row(self, y, color):
+        self.dirty_rows.add(y)
+        self.rows[y] = self.full_row
+        self.shared &= ~(1 << y)
+        self.colors[y] = bytearray((color,)) * self.width
+        for x in range(self.width):
+            self.heights[x] = max(self.heights[x], y + 1)
+
+    def recolor_row(self, y, color):
+        self.dirty_rows.add(y)
+        row = self.rows[y]
+        if self.shared >> y & 1:
+            self.own_row(y)
+        colors = self.colors[y]
+        for x in range(self.width):
+            if row >> x & 1:
+                colors[x] = color
+
+    def clear_rows(self, rows):
+        self.dirty_rows.update(range(min(rows), self.height))
+        shared = self.shared
+        for y in sorted(rows, reverse=True):
+            # each del shifts every row above down in one move
+            del self.rows[y]
+            del self.colors[y]
+            shared = shared & ((1 << y) - 1) | shared >> (y + 1) << y
+        self.shared = shared
+        self.rows += [0] * len(rows)
+        self.colors += [bytearray(self.width) for _ in rows]
+        # the animation has emptied the cleared rows already, so the old
+        # skyline bounds the new one
+        self.update_heights(max(self.heights))
+
+    def update_heights(self, top):
+        # the skyline in one pass down from row top - 1, stopping once every
+        # column has been seen
+        heights = [0] * self.width
+        seen = 0
+        rows = self.rows
+        for y in range(min(top, self.height) - 1, -1, -1):
+            new = rows[y] & ~seen
+            if new:
+                seen |= new
+                while new:
+                    bit = new & -new
+                    heights[bit.bit_length() - 1] = y + 1
+                    new ^= bit
+                if seen == self.full_row:
+                    break
+        self.heights = heights
+
+    def pop_dirty_rows(self):
+        rows = self.dirty_rows
+        self.dirty_rows = set()
+        return rows
+
+    def own_row(self, y):
+        self.colors[y] = bytearray(self.colors[y])
+        self.shared &= ~(1 << y)
+
+    def snapshot(self):
+        # (row bitmasks, row colors, skyline); the color rows are shared
+        # with the board, which copies a row before writing to it again,
+        # so a snapshot costs three tuples of pointers
+        self.shared = (1 << self.height) - 1
+        return tuple(self.rows), tuple(self.colors), tuple(self.heights)
+
+    def restore(self, snapshot):
+        rows, colors, heights = snapshot
+        self.rows = list(rows)
+        self.colors = list(colors)
+        self.heights = list(heights)
+        self.shared = (1 << self.height) - 1
+        self.dirty_rows = set(range(self.height))
+
+    def cells(self):
+        for y, row in enumerate(self.rows):
+            if row == 0:
+                continue
+            colors = self.colors[y]
+            for x in range(self.width):
+                if row >> x & 1:
+                    yield x, y, colors[x]
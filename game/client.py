@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import socket
+
+from game import protocol
+from game.state import GameState
+
+
+# non-blocking connection to a game server for the window, which polls it
+# once per update; only the newest state of a poll is decoded
+class GameClient(object):
+
+    def __init__(self, address):
+        address = protocol.parse_address(address)
+        if isinstance(address, tuple):
+            self.sock = socket.create_connection(address)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address)
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+        # input frames the socket has not taken yet, sent by flush()
+        self.outgoing = bytearray()
+        self.seq = 0
+        # newest input sequence number the server's states include
+        self.acked = 0
+        self.closed = False
+
+    def send(self, kind, value=0):
+        self.seq += 1
+        self.outgoing += protocol.INPUT.pack(kind, self.seq, value)
+        self.flush()
+
+    def flush(self):
+        # whatever the socket does not take now goes out with a later
+        # send() or poll(), so frames are never cut short
+        while self.outgoing and not self.closed:
+            try:
+                sent = self.sock.send(self.outgoing)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.closed = True
+                return
+            del self.outgoing[:sent]
+
+    def send_action(self, action):
+        self.send(protocol.ACTION, action)
+
+    def send_restart(self):
+        self.send(protocol.RESTART)
+
+    def send_pause(self, paused):
+        self.send(protocol.PAUSE, int(paused))
+
+    def read(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b''
+            if not data:
+                self.closed = True
+                return
+            self.buffer += data
+
+    def poll(self):
+        # (newest GameState or None, events of every frame received)
+        self.flush()
+        self.read()
+        buffer = self.buffer
+        header = protocol.STATE_HEADER
+        pos = 0
+        events = 0
+        payload = None
+        while len(buffer) - pos >= header.size:
+            kind, seq, bits, length = header.unpack_from(buffer, pos)
+            if len(buffer) - pos - header.size < length:
+                break
+            if kind != protocol.STATE:
+                raise protocol.ProtocolError('unknown frame kind {}'.format(kind))
+            events |= bits
+            self.acked = seq
+            payload = bytes(buffer[pos + header.size:pos + header.size + length])
+            pos += header.size + length
+        del buffer[:pos]
+        state = None
+        if payload is not None:
+            state = GameState.from_bytes(payload, rng=False)
+        return state, protocol.decode_events(events)
+
+    def close(self):
+        self.sock.close()
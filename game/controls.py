@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import collections
+import time
+
+from game import engine
+
+
+def ticks_for(seconds, tick):
+    return max(1, int(round(seconds / tick)))
+
+
+# key presses and releases are queued with the time they arrived and
+# turned into actions once per game tick. A held move repeats after the
+# delayed auto-shift (das) every auto-repeat rate (arr), both counted in
+# ticks, so repeats stay in step with the game at any frame rate; the key
+# pressed last wins, and releasing it hands over to one still held, which
+# charges its delay again
+class Controls(object):
+
+    def __init__(self, tick, das=0.167, arr=0.033,
+                 repeating=(engine.LEFT, engine.RIGHT, engine.DOWN)):
+        self.das_ticks = ticks_for(das, tick)
+        # at most one repeat per tick
+        self.arr_ticks = ticks_for(arr, tick)
+        self.repeating = frozenset(repeating)
+        self.events = collections.deque()
+        # [action, ticks held], the active one last
+        self.held = []
+
+    def press(self, action, timestamp=None):
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        self.events.append((action, True, timestamp))
+
+    def release(self, action, timestamp=None):
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        self.events.append((action, False, timestamp))
+
+    def reset(self):
+        # releases are missed while the window is inactive
+        self.events.clear()
+        self.held = []
+
+    def is_held(self, action):
+        return any(hold[0] == action for hold in self.held)
+
+    def tick(self):
+        # [(action, time of its key press, or None for a repeat)] of one tick
+        actions = []
+        if self.held:
+            self.held[-1][1] += 1
+        for action, pressed, timestamp in self.events:
+            if pressed:
+                if self.is_held(action):
+                    # the platform's own key repeat
+                    continue
+                actions.append((action, timestamp))
+                if action in self.repeating:
+                    self.held.append([action, 0])
+            elif self.is_held(action):
+                active = self.held[-1][0] == action
+                self.held = [hold for hold in self.held if hold[0] != action]
+                if active and self.held:
+                    self.held[-1][1] = 0
+        self.events.clear()
+        if self.held:
+            action, ticks = self.held[-1]
+            charged = ticks - self.das_ticks
+            if charged >= 0 and charged % self.arr_ticks == 0:
+                actions.append((action, None))
+        return actions
+
+
+# input latency of every key press, into the profiler: to the end of the
+# tick that applied it ('input.state') and to the end of the first frame
+# drawn after that ('input.frame'). seq is the input sequence number of a
+# game server connection, whose states say which inputs they include
+class InputLatency(object):
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        # (seq, press time) not yet in the game state
+        self.pending = collections.deque()
+        # press times in the state but not yet on screen
+        self.unshown = []
+
+    def queued(self, timestamp, seq=0):
+        self.pending.append((seq, timestamp))
+
+    def applied(self, seq=None, now=None):
+        # seq None: everything queued so far is in the state
+        if now is None:
+            now = time.perf_counter()
+        pending = self.pending
+        while pending and (seq is None or pending[0][0] <= seq):
+            timestamp = pending.popleft()[1]
+            self.profiler.sample('input.state', now - timestamp)
+            self.unshown.append(timestamp)
+
+    def shown(self, now=None):
+        if not self.unshown:
+            return
+        if now is None:
+            now = time.perf_counter()
+        for timestamp in self.unshown:
+            self.profiler.sample('input.frame', now - timestamp)
+        self.unshown = []
+
+    def reset(self):
+        self.pending.clear()
+        self.unshown = []
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+import random
+
+from game.board import BOARD_WIDTH, BOARD_HEIGHT, BitBoard, drop_distance
+from game.shapes import ROTATIONS
+from game.state import GameState
+
+# actions
+NOOP = 0
+LEFT = 1
+RIGHT = 2
+DOWN = 3
+ROTATE = 4
+DROP = 5
+
+ACTIONS = (NOOP, LEFT, RIGHT, DOWN, ROTATE, DROP)
+
+# events, drained by the renderer to play sounds
+ACTION_EVENT = 'action'
+ANCHOR_EVENT = 'anchor'
+FULL_LINE_EVENT = 'full_line'
+LEVEL_UP_EVENT = 'level_up'
+
+
+class TetrisEngine(object):
+
+    def __init__(self, tick=1.0/60.0, board_class=BitBoard, rng=None, seed=None,
+                 width=BOARD_WIDTH, height=BOARD_HEIGHT):
+        # fixed simulation step in seconds, see advance()
+        self.tick = tick
+        self.board_class = board_class
+        self.width = width
+        self.height = height
+        # a given rng is one stream shared by every game, otherwise each
+        # game gets its own random.Random(seed)
+        self.shared_rng = rng
+        self.events = []
+        # (4, 18) on the standard 10x20 board
+        self.player_start_pos = (width // 2 - 1, height - 2)
+        self.high_score = 0
+        self.target_score = 0
+        self.basic_score = 100
+        self.full_line_score = 1000
+        self.score_add_step = 10
+        # level curve: points to the next level and seconds per row of
+        # gravity; fall_time shrinks by fall_time_step per level
+        self.level_score = 10000
+        self.level_score_step = 1000
+        self.fall_time = 2
+        self.fall_time_step = 0.1
+        self.min_fall_time = 0.1
+        self.restart(seed)
+
+    def restart(self, seed=None):
+        if self.shared_rng is not None:
+            self.seed = None
+            self.rng = self.shared_rng
+        else:
+            if seed is None:
+                seed = random.getrandbits(64)
+            self.seed = seed
+            self.rng = random.Random(seed)
+        # rng.getstate(), taken once per piece by the first snapshot
+        self.rng_state = None
+        self.ticks = 0
+        self.actions = []
+        self.accumulator = 0.0
+        self.board = self.board_class(self.width, self.height)
+        self.game_over = False
+        self.game_over_animation_count = 0
+        self.show_game_over_label = False
+        self.player_control = True
+        self.full_lines = []
+        self.full_line_anim_x = 0
+        self.full_line_anim_y = 0
+        self.level = 1
+        self.count_down = self.fall_time
+        self.state_time = self.count_down
+        self.points_to_next_level = self.level_score
+        if self.target_score > self.high_score:
+            self.high_score = self.target_score
+        self.target_score = 0
+        self.score = 0
+        self.next_shape = self.rng.randint(0, 6)
+        self.next_color = self.rng.randint(1, 4)
+        self.pieces = 0
+        self.lines = 0
+        self.next_player()
+        self.previous_pos = tuple(self.player_pos)
+        self.previous_piece = self.pieces
+
+    @property
+    def player_shape(self):
+        return self.player_piece.cells
+
+    def snapshot(self):
+        return GameState.capture(self)
+
+    def restore(self, state):
+        state.apply(self)
+
+    def pop_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def step(self, action=NOOP):
+        self.queue(action)
+        self.run_tick()
+        return self.pop_events()
+
+    def queue(self, action):
+        # applied at the start of tick number self.ticks
+        self.actions.append(action)
+
+    def advance(self, elapsed, max_ticks=8, before_tick=None):
+        # run as many fixed ticks as elapsed time allows, carrying the
+        # remainder; max_ticks=None runs the whole backlog, so a headless
+        # game can be advanced faster than real time. before_tick(game) runs
+        # ahead of every tick, e.g. to queue that tick's input
+        self.accumulator += elapsed
+        ticks = 0
+        while self.accumulator >= self.tick:
+            if max_ticks is not None and ticks >= max_ticks:
+                # drop the backlog rather than spiral after a long stall
+                self.accumulator = 0.0
+                break
+            self.accumulator -= self.tick
+            if before_tick is not None:
+                before_tick(self)
+            self.run_tick()
+            ticks += 1
+        return ticks
+
+    def run_tick(self):
+        self.previous_pos = tuple(self.player_pos)
+        self.previous_piece = self.pieces
+        actions = self.actions
+        self.actions = []
+        for action in actions:
+            self.apply(action)
+        self.update(self.tick)
+        self.ticks += 1
+
+    def interpolated_pos(self):
+        # player position blended between the last two ticks for rendering
+        if self.previous_piece != self.pieces:
+            return tuple(self.player_pos)
+        alpha = self.accumulator / self.tick
+        return tuple(previous + (current - previous) * alpha
+                     for previous, current in zip(self.previous_pos, self.player_pos))
+
+    def apply(self, action):
+        if not self.player_control:
+            return
+        if action == LEFT:
+            self.events.append(ACTION_EVENT)
+            self.check_left()
+        elif action == RIGHT:
+            self.events.append(ACTION_EVENT)
+            self.check_right()
+        elif action == DOWN:
+            self.events.append(ACTION_EVENT)
+            self.check_down()
+        elif action == ROTATE:
+            self.events.append(ACTION_EVENT)
+            self.check_rotate()
+        elif action == DROP:
+            self.direct_down()
+
+    def update(self, delta):
+        if self.score < self.target_score:
+            self.score += self.score_add_step
+            self.score = min(self.score, self.target_score)
+
+        if self.score > self.high_score:
+            self.high_score = self.score
+
+        if self.full_lines:
+            self.player_control = False
+            self.remove_full_line_animation()
+
+        if self.game_over:
+            self.do_game_over_animation()
+            return
+
+        self.state_time -= delta
+        if self.state_time <= 0:
+            self.check_down()
+
+    def do_game_over_animation(self):
+        board = self.board
+        if self.game_over_animation_count < board.width * board.height:
+            y = self.game_over_animation_count // board.width
+            board.recolor_row(y, 6)  # dark grey
+            self.game_over_animation_count += board.width
+        else:
+            self.show_game_over_label = True
+
+    def set_game_over(self):
+        self.player_control = False
+        self.game_over_animation_count = 0
+        self.game_over = True
+
+    def check_game_over(self):
+        if self.board.row_occupied(self.board.height - 1):
+            self.set_game_over()
+
+    def add_score(self, points):
+        self.target_score += points
+        self.points_to_next_level -= points
+        if self.points_to_next_level <= 0:
+            self.next_level()
+
+    def next_level(self):
+        self.level += 1
+        self.points_to_next_level = self.level_score + self.level * self.level_score_step
+        self.count_down = self.fall_time - min(self.level * self.fall_time_step,
+                                               self.fall_time - self.min_fall_time)
+        self.events.append(LEVEL_UP_EVENT)
+
+    def check_rotate(self):
+        piece = self.player_piece
+        tmp_next = ROTATIONS[piece.shape][(piece.rotation + 1) % 4]
+        if not self.board.collides(self.player_pos[0], self.player_pos[1], tmp_next):
+            self.player_piece = tmp_next
+
+    def check_left(self):
+        if not self.board.collides(self.player_pos[0] - 1, self.player_pos[1],
+                                   self.player_piece):
+            self.player_pos[0] -= 1
+
+    def check_right(self):
+        if not self.board.collides(self.player_pos[0] + 1, self.player_pos[1],
+                                   self.player_piece):
+            self.player_pos[0] += 1
+
+    def check_down(self):
+        hit = self.board.collides(self.player_pos[0], self.player_pos[1] - 1,
+                                  self.player_piece)
+        if not hit:
+            self.player_pos[1] -= 1
+        else:
+            piece = self.player_piece
+            self.board.place(self.player_pos[0], self.player_pos[1], piece,
+                             self.player_color)
+            min_y = self.player_pos[1] + min(piece.min_y, 0)
+            max_y = self.player_pos[1] + max(piece.max_y, 0)
+            # add score
+            self.events.append(ANCHOR_EVENT)
+            self.add_score(self.basic_score)
+            self.check_full_lines(min_y, max_y)
+            self.next_player()
+        self.state_time = self.count_down
+        self.check_game_over()
+        return hit
+
+    def landing_y(self):
+        x, y = self.player_pos
+        distance = drop_distance(self.board, x, y, self.player_piece)
+        if distance is None:
+            distance = 0
+            while not self.board.collides(x, y - distance - 1, self.player_piece):
+                distance += 1
+        return y - distance
+
+    def direct_down(self):
+        self.player_pos[1] = self.landing_y()
+        self.check_down()
+
+    def remove_full_line_animation(self):
+        if self.full_line_anim_y < len(self.full_lines):
+            line_y = self.full_lines[self.full_line_anim_y]
+            self.board.set(self.full_line_anim_x, line_y, 0)
+            self.full_line_anim_x += 1
+            if self.full_line_anim_x >= self.board.width:
+                self.full_line_anim_x = 0
+                self.full_line_anim_y += 1
+                # add score
+                self.add_score(self.full_line_score)
+        else:
+            self.board.clear_rows(self.full_lines)
+            self.lines += len(self.full_lines)
+            self.player_control = not self.game_over
+            self.full_line_anim_x = 0
+            self.full_line_anim_y = 0
+            self.full_lines = []
+
+    def check_full_lines(self, min_y, max_y):
+        for y in range(min_y, max_y+1):
+            if self.board.is_full(y):
+                self.full_lines.append(y)
+        self.full_lines.sort()
+        if self.full_lines:
+            self.events.append(FULL_LINE_EVENT)
+        for y in self.full_lines:
+            self.board.fill_row(y, 5)  # mark grey
+
+    def next_player(self):
+        self.player_pos = list(self.player_start_pos)
+        self.pieces += 1
+        self.player_piece = ROTATIONS[self.next_shape][0]
+        self.player_color = self.next_color
+        self.next_shape = self.rng.randint(0, 6)
+        self.next_color = self.rng.randint(1, 4)
+        self.rng_state = None
+        if self.board.collides(self.player_pos[0], self.player_pos[1],
+                               self.player_piece):
+            self.board.place(self.player_pos[0], self.player_pos[1],
+                             self.player_piece, self.player_color)
+            self.set_game_over()
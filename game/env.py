@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from game import engine
+from game.board import BOARD_WIDTH, BOARD_HEIGHT
+from game.vector_engine import VectorEngine
+
+# ''' observations
+# A dict of read-only numpy views into the engine state, created once per
+# environment; step() and reset() return the same dict, whose arrays show
+# the new state. Copy them to keep a state.
+#
+# board:      (20, 10) uint8 colors of the locked cells, row 0 at the bottom,
+#             0 for empty; the falling piece is not drawn in
+# piece:      shape id of the falling piece (index into shapes.SHAPES)
+# rotation:   its rotation, 0-3
+# x, y:       its position on the board
+# next_piece: shape id of the next piece
+# score:      displayed score; it counts up towards the points earned
+# level:      current level
+# A VectorEnv adds a leading axis of size N to every array.
+# '''
+
+OBSERVATION_FIELDS = (
+    ('board', 'board', (BOARD_HEIGHT, BOARD_WIDTH), np.uint8),
+    ('piece', 'player_shape', (), np.int64),
+    ('rotation', 'player_rotation', (), np.int64),
+    ('x', 'player_x', (), np.int64),
+    ('y', 'player_y', (), np.int64),
+    ('next_piece', 'next_shape', (), np.int64),
+    ('score', 'score', (), np.int64),
+    ('level', 'level', (), np.int64),
+)
+
+# engine arrays that workers move into shared memory
+SHARED_FIELDS = [field for _, field, _, _ in OBSERVATION_FIELDS] + ['game_over']
+
+ACTION_SPACE = len(engine.ACTIONS)
+
+
+def read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def observation(arrays):
+    # arrays maps engine field names to the arrays to expose
+    return dict((name, read_only(arrays[field]))
+                for name, field, _, _ in OBSERVATION_FIELDS)
+
+
+# a single game with a gym-style interface: reset() -> (obs, info) and
+# step(action) -> (obs, reward, terminated, truncated, info). One step is
+# one tick of a TetrisEngine, whose state is copied into the observation
+# arrays; of the board only the rows the tick changed are copied. The
+# reward is the points earned during that tick
+class TetrisEnv(object):
+
+    action_space = ACTION_SPACE
+
+    def __init__(self, seed=None, tick=1.0/60.0, params=None):
+        # seeds the games that reset() starts without a seed
+        self.rng = random.Random(seed)
+        self.game = engine.TetrisEngine(tick=tick,
+                                        seed=self.rng.getrandbits(64))
+        # engine attribute overrides such as the level curve, see
+        # TetrisEngine.__init__; restart() reads them
+        if params:
+            for name, value in params.items():
+                setattr(self.game, name, value)
+            self.game.restart(self.game.seed)
+        self.arrays = dict((field, np.zeros(shape, dtype=dtype))
+                           for _, field, shape, dtype in OBSERVATION_FIELDS)
+        self.obs = observation(self.arrays)
+        self.last_score = 0
+        self.observe()
+
+    def observe(self):
+        game = self.game
+        arrays = self.arrays
+        board = arrays['board']
+        # a new game's board starts with every row dirty
+        for y in game.board.pop_dirty_rows():
+            board[y] = np.frombuffer(game.board.row_colors(y), dtype=np.uint8)
+        arrays['player_shape'][()] = game.player_piece.shape
+        arrays['player_rotation'][()] = game.player_piece.rotation
+        arrays['player_x'][()] = game.player_pos[0]
+        arrays['player_y'][()] = game.player_pos[1]
+        arrays['next_shape'][()] = game.next_shape
+        arrays['score'][()] = game.score
+        arrays['level'][()] = game.level
+
+    def reset(self, seed=None):
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        self.game.restart(seed)
+        self.last_score = 0
+        self.observe()
+        return self.obs, {}
+
+    def step(self, action):
+        game = self.game
+        game.queue(action)
+        game.run_tick()
+        game.events = []
+        self.observe()
+        reward = game.target_score - self.last_score
+        self.last_score = game.target_score
+        return self.obs, reward, game.game_over, False, {}
+
+
+def shared_layout(n):
+    # (name, offset, shape, dtype) of every array in the shared block
+    fields = [(field, shape, dtype)
+              for _, field, shape, dtype in OBSERVATION_FIELDS]
+    fields += [('game_over', (), np.bool_),
+               ('actions', (), np.int64),
+               ('rewards', (), np.int64),
+               ('terminated', (), np.bool_)]
+    layout = []
+    offset = 0
+    for name, shape, dtype in fields:
+        shape = (n,) + shape
+        layout.append((name, offset, shape, dtype))
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += -(-size // 8) * 8
+    return layout, offset
+
+
+def shared_arrays(buffer, n):
+    layout, _ = shared_layout(n)
+    return dict((name, np.frombuffer(buffer, dtype=dtype, offset=offset,
+                                     count=int(np.prod(shape))).reshape(shape))
+                for name, offset, shape, dtype in layout)
+
+
+def worker(conn, buffer, n, lo, hi, seeds, tick, params):
+    arrays = dict((name, array[lo:hi])
+                  for name, array in shared_arrays(buffer, n).items())
+    sim = VectorEngine(hi - lo, seeds=seeds, tick=tick, autoreset=False)
+    if params:
+        for name, value in params.items():
+            setattr(sim, name, value)
+        sim.rngs = [random.Random(seed) for seed in seeds]
+        sim.restart(np.arange(hi - lo))
+    # the engine only writes its arrays in place, so rebinding them to the
+    # shared block makes every update visible to the parent
+    for field in SHARED_FIELDS:
+        arrays[field][...] = getattr(sim, field)
+        setattr(sim, field, arrays[field])
+    actions = arrays['actions']
+    rewards = arrays['rewards']
+    terminated = arrays['terminated']
+    last_score = np.zeros(hi - lo, dtype=np.int64)
+    everyone = np.arange(hi - lo)
+    while True:
+        command, arg = conn.recv()
+        if command == 'step':
+            sim.step(actions)
+            np.subtract(sim.target_score, last_score, out=rewards)
+            np.copyto(terminated, sim.game_over)
+            done = np.flatnonzero(terminated)
+            if done.size:
+                sim.restart(done)
+            np.copyto(last_score, sim.target_score)
+        elif command == 'reset':
+            if arg is not None:
+                sim.rngs = [random.Random(arg + lo + i) for i in range(hi - lo)]
+            sim.restart(everyone)
+            last_score[:] = 0
+            rewards[:] = 0
+            terminated[:] = False
+        elif command == 'close':
+            conn.close()
+            return
+        conn.send(None)
+
+
+# N games split over worker processes, each stepping its share with a
+# VectorEngine whose arrays live in one shared memory block. step() writes
+# the actions into the block and waits for the workers; observations,
+# rewards and terminated flags are read-only views of the block, so nothing
+# is copied or pickled per step. Finished games are restarted right away
+# and their observation already shows the new game
+class VectorEnv(object):
+
+    action_space = ACTION_SPACE
+
+    def __init__(self, n, workers=None, seeds=None, tick=1.0/60.0, params=None):
+        if seeds is None:
+            seeds = [random.getrandbits(64) for _ in range(n)]
+        workers = max(1, min(n, workers or os.cpu_count() or 1))
+        self.n = n
+        _, size = shared_layout(n)
+        self.buffer = multiprocessing.RawArray('b', size)
+        self.arrays = shared_arrays(self.buffer, n)
+        self.obs = observation(self.arrays)
+        self.rewards = read_only(self.arrays['rewards'])
+        self.terminated = read_only(self.arrays['terminated'])
+        self.truncated = read_only(np.zeros(n, dtype=bool))
+        self.conns = []
+        self.processes = []
+        bounds = np.linspace(0, n, workers + 1).astype(int)
+        # plain ints, random.Random() does not take numpy integers as seeds
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=worker, args=(child, self.buffer, n, lo, hi,
+                                     list(seeds[lo:hi]), tick, params))
+            process.daemon = True
+            process.start()
+            self.conns.append(conn)
+            self.processes.append(process)
+
+    def send(self, command, arg=None):
+        for conn in self.conns:
+            conn.send((command, arg))
+        for conn in self.conns:
+            conn.recv()
+
+    def reset(self, seed=None):
+        # with a seed, game i is reseeded with seed + i
+        self.send('reset', None if seed is None else int(seed))
+        return self.obs, {}
+
+    def step(self, actions):
+        self.arrays['actions'][:] = actions
+        self.send('step')
+        return self.obs, self.rewards, self.terminated, self.truncated, {}
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(('close', None))
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.conns = []
+        self.processes = []
+
+
+def benchmark(n=1000, workers=(1, 2, 4), steps=500, seed=0):
+    # env steps per second of random play
+    rng = np.random.RandomState(seed)
+    results = []
+    env = TetrisEnv(seed=seed)
+    env.reset()
+    start = time.perf_counter()
+    for action in rng.randint(0, ACTION_SPACE, steps * 10):
+        if env.step(action)[2]:
+            env.reset()
+    results.append(('TetrisEnv', 1, 1, steps * 10 / (time.perf_counter() - start)))
+    for count in workers:
+        env = VectorEnv(n, workers=count, seeds=range(seed, seed + n))
+        try:
+            env.reset()
+            start = time.perf_counter()
+            for _ in range(steps):
+                env.step(rng.randint(0, ACTION_SPACE, n))
+            elapsed = time.perf_counter() - start
+        finally:
+            env.close()
+        results.append(('VectorEnv', n, count, n * steps / elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    print('{:<10}{:>8}{:>9}{:>14}'.format('env', 'N', 'workers', 'steps/s'))
+    for name, n, count, rate in benchmark(*map(int, sys.argv[1:2])):
+        print('{:<10}{:>8}{:>9}{:>14.0f}'.format(name, n, count, rate))
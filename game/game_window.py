@@ -1,599 +1,541 @@
 # -*- coding: utf-8 -*-
-import random
+import os
+import time
+
 import pyglet
 from pyglet.gl import *
-from pyglet.image import ImagePattern, ImageData
 from pyglet.window import Window
 from pyglet.window import key
 
+from game import engine
+from game.ai import AutoPlayer
+from game.board import BOARD_WIDTH, BOARD_HEIGHT
+from game.blocks import (BLACK, DARK_GREY, WHITE, COLORS, int_color,
+                         lighten_color, darken_color, block_images,
+                         load_atlas_data)
+from game.controls import Controls, InputLatency
+from game.engine import TetrisEngine
+from game.hud import GlyphCounter
+from game.loader import AssetLoader
+from game.mixer import SoundMixer, PygletBackend
+from game.profiler import FrameProfiler
+from game.profiler_overlay import ProfilerOverlay
+from game.replay import Recorder
+from game.sprite_renderer import SpriteBoardRenderer
+
+
+RESOURCE_DIR = 'resources'
 
 pyglet.options['audio'] = ('openal', 'directsound', 'silent')
-pyglet.resource.path = ['resources']
-pyglet.resource.reindex()
-pyglet.resource.add_font('MONOFONT.TTF')
-
-
-BLACK = (0.2, 0.2, 0.2, 1.0)      # color 0
-RED = (1.0, 0.5, 0.5, 1.0)        # color 1
-GREEN = (0.5, 1.0, 0.5, 1.0)      # color 2
-BLUE = (0.5, 0.5, 1.0, 1.0)       # color 3
-YELLOW = (0.8, 0.8, 0.5, 1.0)     # color 4
-GREY = (0.7, 0.7, 0.7, 1.0)       # color 5
-DARK_GREY = (0.5, 0.5, 0.5, 1.0)  # color 6
-WHITE = (0.9, 0.9, 0.9, 1.0)      # color 7
-
-COLORS = [BLACK, RED, GREEN, BLUE, YELLOW, GREY, DARK_GREY, WHITE]
-
-# ''' SHAPE coordinate
-# -1, 1  0, 1  1, 1  2, 1
-# -1, 0  0, 0  1, 0  2, 0
-# -1,-1  0,-1  1,-1  2,-1
-# -1,-2  0,-2  1,-2  2,-2
-# '''
-
-SHAPES = [
-    ((-1, 0), (0, 0), (1, 0), (2, 0)),    # horizontal bar
-    ((0, 0), (1, 0), (0, -1), (1, -1)),   # square box
-    ((-1, 0), (0, 0), (1, 0), (0, -1)),   # T
-    ((0, 1), (0, 0), (0, -1), (1, -1)),   # L
-    ((1, 1), (1, 0), (1, -1), (0, -1)),   # reverse L
-    ((1, 1), (1, 0), (0, 0), (0, -1)),    # N
-    ((0, 1), (0, 0), (1, 0), (1, -1)),    # reverse N
-]
-
-
-def int_color(float_color):
-    return tuple(map(lambda c: int(c*255), float_color))
-
-
-def lighten_color(float_color):
-    return tuple(map(lambda c: min(c*1.2, 1.0), float_color))
-
-
-def darken_color(float_color):
-    return tuple(map(lambda c: c*0.8, float_color))
-
-
-class BlockImagePattern(ImagePattern):
-    def __init__(self, color):
-        self.color = int_color(color)
-        self.light_color = int_color(lighten_color(color))
-        self.dark_color = int_color(darken_color(color))
-
-    def create_image(self, width, height):
-        data = b''
-        for i in range(width * height):
-            pos_x = i % width
-            pos_y = i // width
-            if pos_x / width <= 0.08:
-                data += bytes(self.light_color)
-            elif pos_y / height <= 0.08:
-                data += bytes(self.dark_color)
-            elif pos_y / height >= 0.92:
-                data += bytes(self.light_color)
-            elif pos_x / width >= 0.92:
-                data += bytes(self.dark_color)
-            else:
-                data += bytes(self.color)
-        return ImageData(width, height, 'RGBA', data)
+pyglet.resource.path = [RESOURCE_DIR]
+
+GHOST_COLORS = [darken_color(darken_color(color)) for color in COLORS]
+
+SOUND_FILES = (
+    (engine.ACTION_EVENT, 'action.wav'),
+    (engine.ANCHOR_EVENT, 'anchor.wav'),
+    (engine.FULL_LINE_EVENT, 'full_line.wav'),
+    (engine.LEVEL_UP_EVENT, 'level_up.wav'),
+)
+
+# voices per effect; key mashing can overlap a few action sounds, while a
+# new line clear or level up cuts off the previous one
+SOUND_LIMITS = {
+    engine.ACTION_EVENT: 4,
+    engine.ANCHOR_EVENT: 2,
+    engine.FULL_LINE_EVENT: 1,
+    engine.LEVEL_UP_EVENT: 1,
+}
+
+
+def load_sounds():
+    # decoded into memory on the loader thread; the mixer voices playing
+    # them are created on the main thread
+    # relative to the launcher like pyglet.resource.path, not to the
+    # working directory
+    directory = os.path.join(pyglet.resource.get_script_home(), RESOURCE_DIR)
+    return dict((event, pyglet.media.load(os.path.join(directory, name),
+                                          streaming=False))
+                for event, name in SOUND_FILES)
 
 
 class GameWindow(Window):
 
     def __init__(self, *args, **kwargs):
+        # time to first frame and to a playable game are measured from
+        # start_time, which the launcher takes before importing pyglet
+        self.start_time = kwargs.pop('start_time', time.perf_counter())
+        self.block_cache_dir = kwargs.pop('block_cache_dir', None)
+        self.shader_board = kwargs.pop('shader_board', False)
+        tick_rate = kwargs.pop('tick_rate', 60)
+        self.replay_dir = kwargs.pop('replay_dir', None)
+        self.profile_path = kwargs.pop('profile_path', None)
+        # delayed auto-shift and auto-repeat rate of held moves, in seconds
+        das = kwargs.pop('das', 0.167)
+        arr = kwargs.pop('arr', 0.033)
+        # 'host:port' or a Unix socket path of a game server; the window then
+        # only sends inputs and shows the states the server sends back
+        server = kwargs.pop('server', None)
+        # (columns, rows) of the playfield; only the standard board can be
+        # played on a server or recorded
+        self.board_size = kwargs.pop('board_size', (BOARD_WIDTH, BOARD_HEIGHT))
         super(GameWindow, self).__init__(*args, **kwargs)
         self.batch = pyglet.graphics.Batch()
-        self.title_label = pyglet.text.Label(text='Tetris',
-                                             font_name='Monofonto',
-                                             font_size=32,
-                                             color=int_color(WHITE),
-                                             x=self.width/2, y=self.height-20,
-                                             anchor_x='center',
-                                             anchor_y='center',
-                                             batch=self.batch)
 
-        self.block_size = self.width / 40
-        # board info
-        self.left = self.width / 2 - self.block_size * 6
-        self.right = self.width / 2 + self.block_size * 6
-        self.bottom = self.height / 2 - self.block_size * 11
-        self.top = self.height / 2 + self.block_size * 11
+        self.update_board_info(self.width, self.height)
+        # set by on_resize, the next on_draw lays the window out again
+        self.resized = False
+
+        self.engine = TetrisEngine(tick=1.0/tick_rate, width=self.board_size[0],
+                                   height=self.board_size[1])
+        self.client = None
+        if server:
+            from game.client import GameClient
+            self.client = GameClient(server)
+        self.recorder = Recorder(self.engine.seed, self.engine.tick)
+        self.profiler = FrameProfiler()
+        self.controls = Controls(self.engine.tick, das, arr)
+        self.latency = InputLatency(self.profiler)
+        self.paused = False
+        # set once the game server has gone away
+        self.disconnected = False
+        self.focused = True
+        self.shown = True
+        self.scheduled = False
+        pyglet.gl.glClearColor(*BLACK)
 
-        self.BLOCK_IMAGES = [
-            pyglet.image.create(int(self.block_size), int(self.block_size),
-                                BlockImagePattern(color)) for color in COLORS
+        # the window shows only this label until the board can be drawn;
+        # the default font needs no resource lookup
+        self.loading_label = pyglet.text.Label('Loading...', font_size=20,
+                                               color=int_color(WHITE),
+                                               x=self.width/2,
+                                               y=self.height/2,
+                                               anchor_x='center',
+                                               anchor_y='center')
+        self.loading = True
+        self.first_frame = False
+        self.mixer = SoundMixer(PygletBackend())
+        # set while the AI is playing
+        self.autoplayer = None
+        self.loader = AssetLoader()
+        self.atlas_size = self.block_size
+        self.loader.add('atlas', load_atlas_data, COLORS + GHOST_COLORS,
+                        self.atlas_size, self.block_cache_dir)
+        self.loader.add('sounds', load_sounds)
+        self.loader.start()
+        # (background job the stage waits for, stage), one stage per tick
+        self.stages = [
+            (None, self.load_fonts),
+            (None, self.create_labels),
+            ('atlas', self.create_board),
+            ('sounds', self.attach_sounds),
         ]
+        self.reschedule()
+        self.key_actions = {
+            key.LEFT: engine.LEFT,
+            key.RIGHT: engine.RIGHT,
+            key.DOWN: engine.DOWN,
+            key.UP: engine.ROTATE,
+            key.SPACE: engine.DROP,
+        }
+
+    def load_step(self):
+        job, stage = self.stages[0]
+        if job is not None and not self.loader.done(job):
+            return
+        self.stages.pop(0)
+        stage()
 
-        self.board = [0 for _ in range(10 * 20)]
-
-        font = pyglet.font.load(name='Monofonto', size=16)
-        self.clock_display = pyglet.clock.ClockDisplay(font=font,
-                                                       color=(.8, .8, .8, .8))
-        pyglet.clock.schedule_interval(self.update, 1.0/60.0)
-        pyglet.gl.glClearColor(*BLACK)
-        self.make_background()
+    def load_fonts(self):
+        pyglet.resource.reindex()
+        pyglet.resource.add_font('MONOFONT.TTF')
 
-        self.player_start_pos = (4, 18)
-        self.player_pos = [4, 18]
-        self.player_shape = list(SHAPES[random.randint(0, 6)])
-        self.player_color = random.randint(1, 4)
-
-        self.next_shape = random.randint(0, 6)
-        self.next_color = random.randint(1, 4)
-
-        self.count_down = 2
-        self.state_time = self.count_down
-
-        self.game_over = False
-        self.game_over_animation_count = 0
-
-        self.player_control = True
-        self.full_lines = []
-        self.full_line_anim_x = 0
-        self.full_line_anim_y = 0
-
-        self.level = 1
-        self.points_to_next_level = 10000
-        self.high_score = 0
-        self.target_score = 0
-        self.score = 0
-        self.basic_score = 100
-        self.full_line_score = 1000
-        self.score_add_step = 10
-        self.score_label = pyglet.text.Label('Score: 0',
+    def create_labels(self):
+        # placed and sized by layout_labels()
+        self.title_label = pyglet.text.Label(text='Tetris',
                                              font_name='Monofonto',
-                                             font_size=20,
                                              color=int_color(WHITE),
-                                             x=self.right+self.block_size*2,
-                                             y=self.bottom+self.block_size*22.5,
+                                             anchor_x='center',
+                                             anchor_y='center',
                                              batch=self.batch)
-        self.high_score_label = pyglet.text.Label('High Score: {}'.format(self.high_score),
-                                                  font_name='Monofonto',
-                                                  font_size=20,
-                                                  color=int_color(WHITE),
-                                                  x=self.right+self.block_size*2,
-                                                  y=self.bottom+self.block_size*24,
-                                                  batch=self.batch)
-        self.show_game_over_label = False
+        self.profiler_overlay = ProfilerOverlay(self.profiler, 10, self.height - 50)
+        self.make_background()
+
+        self.score_counter = GlyphCounter(self.batch, 'Score: ', x=0, y=0,
+                                          font_size=20,
+                                          color=int_color(WHITE))
+        self.high_score_counter = GlyphCounter(self.batch, 'High Score: ',
+                                               x=0, y=0, font_size=20,
+                                               color=int_color(WHITE))
         self.game_over_label = pyglet.text.Label('Game Over',
                                                  font_name='Monofonto',
-                                                 font_size=32,
                                                  color=int_color(WHITE),
-                                                 x=self.width/2,
-                                                 y=self.height/2,
                                                  anchor_x='center',
                                                  anchor_y='center')
         self.restart_label = pyglet.text.Label('press Enter to restart',
                                                font_name='Monofonto',
-                                               font_size=20,
                                                color=int_color(WHITE),
-                                               x=self.width/2,
-                                               y=self.height/2-32,
                                                anchor_x='center',
                                                anchor_y='center')
+        self.pause_label = pyglet.text.Label('Paused',
+                                             font_name='Monofonto',
+                                             color=int_color(WHITE),
+                                             anchor_x='center',
+                                             anchor_y='center')
+        self.disconnected_label = pyglet.text.Label('Disconnected',
+                                                    font_name='Monofonto',
+                                                    color=int_color(WHITE),
+                                                    anchor_x='center',
+                                                    anchor_y='center')
         self.control_label = pyglet.text.Label('Left/Right/Down: move\n'
                                                'Up: rotate\n'
-                                               'Space: anchor',
+                                               'Space: anchor\n'
+                                               'P: pause\n'
+                                               'A: autoplay',
                                                font_name='Monofonto',
-                                               font_size=16,
                                                color=int_color(WHITE),
-                                               x=self.left-220,
-                                               y=self.top-60,
                                                width=200,
                                                multiline=True,
                                                batch=self.batch)
         self.snd_control_label = pyglet.text.Label('N: toggle sound',
                                                    font_name='Monofonto',
-                                                   font_size=16,
                                                    color=int_color(WHITE),
-                                                   x=self.left-220,
-                                                   y=self.top-128,
                                                    batch=self.batch)
         self.snd_indication_label = pyglet.text.Label('Sound: Enabled',
                                                       font_name='Monofonto',
-                                                      font_size=16,
                                                       color=int_color(WHITE),
-                                                      x=self.left-220,
-                                                      y=self.top-148,
                                                       batch=self.batch)
-        self.level_label = pyglet.text.Label('Level: 1',
-                                             font_name='Monofonto',
-                                             font_size=20,
-                                             color=int_color(WHITE),
-                                             x=self.right+self.block_size*2,
-                                             y=self.bottom+self.block_size*16,
-                                             batch=self.batch)
-        self.play_sound = True
-        self.action_sound = pyglet.resource.media("action.wav", streaming=False)
-        self.anchor_sound = pyglet.resource.media("anchor.wav", streaming=False)
-        self.full_line_sound = pyglet.resource.media("full_line.wav", streaming=False)
-        self.level_up_sound = pyglet.resource.media("level_up.wav", streaming=False)
+        self.level_counter = GlyphCounter(self.batch, 'Level: ', x=0, y=0,
+                                          font_size=20,
+                                          color=int_color(WHITE))
+
+    def create_board(self):
+        # the atlas loaded in the background goes into the size-keyed cache;
+        # if the window was resized meanwhile, load_block_images() makes the
+        # one it needs instead
+        block_images(COLORS + GHOST_COLORS, self.atlas_size,
+                     data=self.loader.result('atlas'))
+        self.load_block_images()
+        if self.shader_board:
+            from game.shader_renderer import ShaderBoardRenderer
+            renderer_class = ShaderBoardRenderer
+        else:
+            renderer_class = SpriteBoardRenderer
+        self.board_renderer = renderer_class(self.batch, self.BLOCK_IMAGES,
+                                             self.GHOST_IMAGES, *self.board_size)
+        self.loading = False
+        self.relayout()
+        self.refresh_labels()
+        self.report_startup('ready')
+
+    def load_block_images(self):
+        images = block_images(COLORS + GHOST_COLORS, self.block_size,
+                              self.block_cache_dir)
+        self.image_size = self.block_size
+        self.BLOCK_IMAGES = images[:len(COLORS)]
+        self.GHOST_IMAGES = images[len(COLORS):]
+
+    def attach_sounds(self):
+        # events before this point are played silently
+        for event, source in self.loader.result('sounds').items():
+            self.mixer.add(event, source, SOUND_LIMITS[event])
+
+    def report_startup(self, name):
+        seconds = time.perf_counter() - self.start_time
+        self.profiler.mark('startup.' + name, seconds)
+        if self.profile_path is not None:
+            print('startup: {} after {:.1f} ms'.format(name, seconds * 1000))
 
     def update_board_info(self, width, height):
-        self.width = width
-        self.height = height
-        self.block_size = width / 40
-        self.left = self.width / 2 - self.block_size * 6
-        self.right = self.width / 2 + self.block_size * 6
-        self.bottom = self.height / 2 - self.block_size * 11
-        self.top = self.height / 2 + self.block_size * 11
+        # whole pixels, so blocks stay crisp. The labels are sized in units
+        # of a standard board's block, 40 of which fit across and 30 down;
+        # they need 28 units beside the walled board and 8 above and below
+        # it, and a larger board gets smaller blocks to leave them that room
+        columns, rows = self.board_size
+        self.unit_size = max(1, min(width // 40, height // 30))
+        self.block_size = max(1, min(self.unit_size,
+                                     (width - 28 * self.unit_size) // (columns + 2),
+                                     (height - 8 * self.unit_size) // (rows + 2)))
+        self.left = width // 2 - self.block_size * (columns + 2) // 2
+        self.right = self.left + self.block_size * (columns + 2)
+        self.bottom = height // 2 - self.block_size * (rows + 2) // 2
+        self.top = self.bottom + self.block_size * (rows + 2)
+
+    def on_resize(self, width, height):
+        super(GameWindow, self).on_resize(width, height)
+        # a drag resizes many times between frames, only the last size is
+        # laid out
+        self.resized = True
+
+    def relayout(self):
+        self.resized = False
+        self.update_board_info(self.width, self.height)
+        self.loading_label.x = self.width / 2
+        self.loading_label.y = self.height / 2
+        if self.loading:
+            return
+        if self.block_size != self.image_size:
+            self.load_block_images()
+            self.board_renderer.set_images(self.BLOCK_IMAGES, self.GHOST_IMAGES)
+        self.board_renderer.layout(self.left, self.bottom, self.block_size,
+                                   self.right + self.unit_size * 4,
+                                   self.top - self.unit_size * 3)
+        self.layout_background()
+        self.layout_labels()
+
+    def layout_labels(self):
+        # font sizes and offsets were chosen for 20 pixel blocks
+        scale = self.unit_size / 20.0
+        center_x = self.width / 2
+        center_y = self.height / 2
+        side = self.left - 220 * scale
+        for label, font_size, x, y in (
+                (self.title_label, 32, center_x, self.height - 20 * scale),
+                (self.game_over_label, 32, center_x, center_y),
+                (self.restart_label, 20, center_x, center_y - 32 * scale),
+                (self.pause_label, 32, center_x, center_y),
+                (self.disconnected_label, 32, center_x, center_y),
+                (self.control_label, 16, side, self.top - 60 * scale),
+                (self.snd_control_label, 16, side, self.top - 171 * scale),
+                (self.snd_indication_label, 16, side, self.top - 191 * scale)):
+            label.begin_update()
+            label.font_size = font_size * scale
+            label.x = x
+            label.y = y
+            if label.multiline:
+                label.width = 200 * scale
+            label.end_update()
+        for counter, y in ((self.score_counter, 0.5),
+                           (self.high_score_counter, 2),
+                           (self.level_counter, -6)):
+            counter.set_font_size(20 * scale)
+            counter.move(self.right + self.unit_size * 2,
+                         self.top + self.unit_size * y)
+        self.profiler_overlay.move(10 * scale, self.height - 50 * scale, scale)
 
     def on_draw(self):
+        profiler = self.profiler
         self.clear()
-        self.draw_board()
-        self.draw_next_shape()
-
-        if self.full_lines:
-            self.player_control = False
-            self.remove_full_line_animation()
-
-        if self.player_control:
-            self.draw_player()
-        self.batch.draw()
-        if self.show_game_over_label:
-            self.game_over_label.draw()
-            self.restart_label.draw()
-        self.clock_display.draw()
+        if not self.first_frame:
+            self.first_frame = True
+            self.report_startup('first_frame')
+        if self.resized:
+            with profiler.phase('layout'):
+                self.relayout()
+        if self.loading:
+            self.loading_label.draw()
+            return
+        with profiler.phase('board'):
+            self.board_renderer.update_board(self.engine.board)
+        with profiler.phase('pieces'):
+            self.board_renderer.update_player(self.engine)
+            self.board_renderer.update_next_shape(self.engine)
+        with profiler.phase('batch'):
+            self.batch.draw()
+            if self.disconnected:
+                self.disconnected_label.draw()
+            elif self.engine.show_game_over_label:
+                self.game_over_label.draw()
+                self.restart_label.draw()
+            elif not self.running():
+                self.pause_label.draw()
+        with profiler.phase('overlay'):
+            self.profiler_overlay.draw()
+        self.latency.shown()
+        profiler.end_frame()
 
     def update(self, delta):
-        if self.score < self.target_score:
-            self.score += self.score_add_step
-            self.score = min(self.score, self.target_score)
-            self.update_score_label()
-
-        if self.score > self.high_score:
-            self.high_score = self.score
-            self.high_score_label.text = 'High Score: {}'.format(self.high_score)
-
-        if self.game_over:
-            self.do_game_over_animation()
+        if self.stages:
+            self.load_step()
+        if not self.loading and self.running():
+            with self.profiler.phase('update'):
+                if self.autoplayer is not None:
+                    self.queue_action(self.autoplayer.act(self.engine))
+                if self.client is not None:
+                    # the server ticks the game, input is read once per update
+                    self.tick_controls(self.engine)
+                    self.receive_state()
+                    self.latency.applied(self.client.acked)
+                    if self.client.closed:
+                        # the last state stays on screen, the clock stops
+                        self.disconnected = True
+                else:
+                    self.engine.advance(delta, before_tick=self.tick_controls)
+                    self.latency.applied()
+                self.play_events()
+            with self.profiler.phase('labels'):
+                self.refresh_labels()
+        self.reschedule()
+
+    def running(self):
+        return (not self.paused and self.focused and self.shown
+                and not self.disconnected
+                and not (self.engine.show_game_over_label
+                         # the score still counts up to the final one
+                         and self.engine.score == self.engine.target_score))
+
+    def reschedule(self):
+        # the clock only runs while something on screen can change. With
+        # nothing scheduled pyglet's loop blocks until the next window event,
+        # and every handled event redraws the window, so input wakes it at once
+        active = bool(self.stages) or self.running()
+        if active == self.scheduled:
             return
-
-        self.state_time -= delta
-        if self.state_time <= 0:
-            self.check_down()
-
-    def update_score_label(self):
-        self.score_label.text = 'Score: {}'.format(self.score)
-
-    def update_level_label(self):
-        self.level_label.text = 'Level: {}'.format(self.level)
+        self.scheduled = active
+        if active:
+            self.profiler.idle()
+            pyglet.clock.schedule_interval(self.update, 1.0/60.0)
+        else:
+            pyglet.clock.unschedule(self.update)
+            # key releases may be missed until the game runs again
+            self.controls.reset()
+            self.latency.reset()
+        if self.client is not None:
+            self.client.send_pause(not active)
+
+    def receive_state(self):
+        state, events = self.client.poll()
+        if state is not None:
+            self.engine.restore(state)
+        self.engine.events.extend(events)
+
+    def on_activate(self):
+        self.focused = True
+        self.reschedule()
+
+    def on_deactivate(self):
+        self.focused = False
+        self.reschedule()
+
+    def on_show(self):
+        self.shown = True
+        self.reschedule()
+
+    def on_hide(self):
+        self.shown = False
+        self.reschedule()
+
+    def refresh_labels(self):
+        # the counters only touch their sprites when a value changes
+        self.score_counter.set(self.engine.score)
+        self.high_score_counter.set(self.engine.high_score)
+        self.level_counter.set(self.engine.level)
+
+    def play_events(self):
+        play = self.mixer.play
+        for event in self.engine.pop_events():
+            play(event)
 
     def restart(self):
-        self.game_over = False
-        self.show_game_over_label = False
-        self.player_control = True
-        self.game_over_animation_count = 0
-        self.level = 1
-        self.count_down = 2
-        self.update_level_label()
-        self.points_to_next_level = 10000
-        if self.target_score > self.high_score:
-            self.high_score = self.target_score
-        self.target_score = 0
-        self.score = 0
-        self.update_score_label()
-        self.board = [0 for _ in range(10 * 20)]
-        self.next_shape = random.randint(0, 6)
-        self.next_color = random.randint(1, 4)
-        self.next_player()
-
-    def do_game_over_animation(self):
-        if self.game_over_animation_count < 10 * 20:
-            for i in range(10):
-                if self.board[self.game_over_animation_count] != 0:
-                    self.board[self.game_over_animation_count] = 6  # dark grey
-                self.game_over_animation_count += 1
-        else:
-            self.show_game_over_label = True
+        if self.client is not None:
+            self.client.send_restart()
+        self.save_replay()
+        self.engine.restart()
+        self.recorder = Recorder(self.engine.seed, self.engine.tick)
+        self.refresh_labels()
+        self.reschedule()
+
+    def save_replay(self):
+        if not self.replay_dir or self.client is not None:
+            return
+        if not os.path.isdir(self.replay_dir):
+            os.makedirs(self.replay_dir)
+        path = os.path.join(self.replay_dir, '{:016x}.ttr'.format(self.engine.seed))
+        self.recorder.save(path, self.engine.ticks, self.engine.target_score)
+
+    def on_close(self):
+        self.save_replay()
+        if self.profile_path:
+            self.profiler.dump(self.profile_path)
+        if self.client is not None:
+            self.client.close()
+        super(GameWindow, self).on_close()
 
     def on_key_press(self, symbol, modifiers):
-        if self.player_control:
-            if symbol == key.LEFT:
-                if self.play_sound:
-                    self.action_sound.play()
-                self.check_left()
-            if symbol == key.RIGHT:
-                if self.play_sound:
-                    self.action_sound.play()
-                self.check_right()
-            if symbol == key.DOWN:
-                if self.play_sound:
-                    self.action_sound.play()
-                self.check_down()
-            if symbol == key.UP:
-                if self.play_sound:
-                    self.action_sound.play()
-                self.check_rotate()
-            if symbol == key.SPACE:
-                self.direct_down()
+        if self.loading:
+            return
+        if symbol in self.key_actions and self.running():
+            # the press is timestamped here and acted on in the next tick
+            self.controls.press(self.key_actions[symbol], time.perf_counter())
 
+        if symbol == key.F3:
+            self.profiler_overlay.toggle()
         if symbol == key.N:
-            self.play_sound = not self.play_sound
-            if self.play_sound:
+            self.mixer.set_enabled(not self.mixer.enabled)
+            if self.mixer.enabled:
                 self.snd_indication_label.text = 'Sound: Enabled'
             else:
                 self.snd_indication_label.text = 'Sound: Disabled'
+        # the AI plans on the standard board only
+        if symbol == key.A and self.board_size == (BOARD_WIDTH, BOARD_HEIGHT):
+            if self.autoplayer is None:
+                # planning runs inside update(), keep it under one frame
+                self.autoplayer = AutoPlayer(budget=0.01)
+            else:
+                self.autoplayer = None
+        if symbol == key.P and not self.engine.game_over:
+            self.paused = not self.paused
+            self.reschedule()
         if symbol == key.ENTER:
-            if self.game_over:
+            if self.engine.game_over and not self.disconnected:
                 self.restart()
 
-    def check_game_over(self):
-        for cell in self.board[-10:]:
-            if cell != 0:
-                self.player_control = False
-                self.game_over_animation_count = 0
-                self.game_over = True
-                break
-
-    def add_score(self, points):
-        self.target_score += points
-        self.points_to_next_level -= points
-        if self.points_to_next_level <= 0:
-            self.next_level()
-
-    def next_level(self):
-        self.level += 1
-        self.points_to_next_level = 10000 + self.level * 1000
-        self.update_level_label()
-        self.count_down = 2.0 - min(self.level*0.1, 1.9)
-        if self.play_sound:
-            self.level_up_sound.play()
-
-    def check_rotate(self):
-        tmp_next = []
-        for pos in self.player_shape:
-            tmp_next.append((pos[1] * -1, pos[0] - 1))
-        can_rotate = True
-        for pos in tmp_next:
-            if (self.player_pos[0] + pos[0]) < 0 \
-                    or (self.player_pos[0] + pos[0]) > 9 \
-                    or (self.player_pos[1] + pos[1]) < 0 \
-                    or self.board[(self.player_pos[0] + pos[0]) +
-                                  (self.player_pos[1] + pos[1]) * 10] != 0:
-                can_rotate = False
-                break
-        if can_rotate:
-            self.player_shape = tmp_next
-
-    def check_left(self):
-        can_move = True
-        for pos in self.player_shape:
-            next_x = self.player_pos[0] + pos[0] - 1
-            if next_x < 0:
-                can_move = False
-                break
-            next_y = self.player_pos[1] + pos[1]
-            if self.board[next_x + next_y * 10] != 0:
-                can_move = False
-                break
-        if can_move:
-            self.player_pos[0] -= 1
-
-    def check_right(self):
-        can_move = True
-        for pos in self.player_shape:
-            next_x = self.player_pos[0] + pos[0] + 1
-            if next_x > 9:
-                can_move = False
-                break
-            next_y = self.player_pos[1] + pos[1]
-            if self.board[next_x + next_y * 10] != 0:
-                can_move = False
-                break
-        if can_move:
-            self.player_pos[0] += 1
-
-    def check_down(self):
-        hit = False
-        for pos in self.player_shape:
-            next_y = self.player_pos[1] + pos[1] - 1
-            if next_y < 0:
-                hit = True
-            elif self.board[(self.player_pos[0]+pos[0]) + next_y*10] != 0:
-                hit = True
-
-        if not hit:
-            self.player_pos[1] -= 1
-        else:
-            min_y = self.player_pos[1]
-            max_y = self.player_pos[1]
-            for pos in self.player_shape:
-                x = self.player_pos[0] + pos[0]
-                y = self.player_pos[1] + pos[1]
-                self.board[y * 10 + x] = self.player_color
-                min_y = min(min_y, y)
-                max_y = max(max_y, y)
-            # add score
-            if self.play_sound:
-                self.anchor_sound.play()
-            self.add_score(self.basic_score)
-            self.check_full_lines(min_y, max_y)
-            self.next_player()
-        self.state_time = self.count_down
-        self.check_game_over()
-        return hit
-
-    def direct_down(self):
-        while not self.check_down():
-            pass
-
-    def remove_full_line_animation(self):
-        if self.full_line_anim_y < len(self.full_lines):
-            line_y = self.full_lines[self.full_line_anim_y]
-            self.board[self.full_line_anim_x + line_y * 10] = 0
-            self.full_line_anim_x += 1
-            if self.full_line_anim_x > 9:
-                self.full_line_anim_x = 0
-                self.full_line_anim_y += 1
-                # add score
-                self.add_score(self.full_line_score)
-        else:
-            for num, line in enumerate(self.full_lines):
-                current_line = line - num
-                for y in range(current_line, 19):
-                    for x in range(10):
-                        self.board[x + y * 10] = self.board[x + (y + 1) * 10]
-            self.player_control = True
-            self.full_line_anim_x = 0
-            self.full_line_anim_y = 0
-            self.full_lines = []
-
-    def check_full_lines(self, min_y, max_y):
-        for y in range(min_y, max_y+1):
-            full_line = True
-            for x in range(10):
-                if self.board[x + y * 10] == 0:
-                    full_line = False
-                    break
-            if full_line:
-                self.full_lines.append(y)
-        self.full_lines.sort()
-        if self.full_lines and self.play_sound:
-            self.full_line_sound.play()
-        for y in self.full_lines:
-            for x in range(10):
-                self.board[x + y * 10] = 5  # mark grey
-
-    def next_player(self):
-        self.player_pos = list(self.player_start_pos)
-        self.player_shape = list(SHAPES[self.next_shape])
-        self.player_color = self.next_color
-        self.next_shape = random.randint(0, 6)
-        self.next_color = random.randint(1, 4)
-        for pos in self.player_shape:
-            pos_x = self.player_pos[0] + pos[0]
-            pos_y = self.player_pos[1] + pos[1]
-            if self.board[pos_x + pos_y * 10] != 0:
-                for new_pos in self.player_shape:
-                    self.board[(self.player_pos[0]+new_pos[0])+(self.player_pos[1]+new_pos[1])*10] = self.player_color
-                self.game_over = True
-                break
-
-    def draw_player(self):
-        if self.game_over:
+    def on_key_release(self, symbol, modifiers):
+        if symbol in self.key_actions:
+            self.controls.release(self.key_actions[symbol], time.perf_counter())
+
+    def tick_controls(self, game):
+        for action, timestamp in self.controls.tick():
+            self.queue_action(action)
+            if timestamp is not None:
+                seq = self.client.seq if self.client is not None else 0
+                self.latency.queued(timestamp, seq)
+
+    def queue_action(self, action):
+        if action == engine.NOOP:
             return
-        for pos in self.player_shape:
-            x = self.left + (self.player_pos[0] + pos[0] + 1) * self.block_size
-            y = self.bottom + (self.player_pos[1] + pos[1] + 1) * self.block_size
-            self.BLOCK_IMAGES[self.player_color].blit(x, y)
-
-    def draw_next_shape(self):
-        left = self.right + self.block_size * 4
-        bottom = self.bottom + self.block_size * 19
-        for pos in SHAPES[self.next_shape]:
-            x = left + pos[0] * self.block_size
-            y = bottom + pos[1] * self.block_size
-            self.BLOCK_IMAGES[self.next_color].blit(x, y)
-
-    def draw_board(self):
+        if self.client is not None:
+            self.client.send_action(action)
+        else:
+            self.recorder.record(self.engine.ticks, action)
+            self.engine.queue(action)
+
+    def background_quads(self):
+        # (x0, y0, x1, y1, color) of the walls and their bevels, in drawing
+        # order
         size = self.block_size
-        for i, v in enumerate(self.board):
-            if v == 0:
-                continue
-            pos_x = i % 10
-            pos_y = i // 10
-            x = self.left + (pos_x + 1) * size
-            y = self.bottom + (pos_y + 1) * size
-            self.BLOCK_IMAGES[v].blit(x, y)
+        left, right, bottom, top = self.left, self.right, self.bottom, self.top
+        color = DARK_GREY
+        dark_color = darken_color(DARK_GREY)
+        light_color = lighten_color(DARK_GREY)
+        return (
+            # left wall
+            (left, bottom, left+size, top, color),
+            (left, bottom, left+size, bottom+size*0.1, dark_color),
+            (left+size*0.9, bottom, left+size, top, dark_color),
+            (left, top-size*0.1, left+size, top, light_color),
+            (left, bottom, left+size*0.1, top, light_color),
+            # right wall
+            (right-size, bottom, right, top, color),
+            (right-size, bottom, right, bottom+size*0.1, dark_color),
+            (right-size*0.1, bottom, right, top, dark_color),
+            (right-size, top-size*0.1, right, top, light_color),
+            (right-size, bottom, right-size*0.9, top, light_color),
+            # bottom wall
+            (left, bottom, right, bottom+size, color),
+            (left, bottom, right, bottom+size*0.1, dark_color),
+            (right-size*0.1, bottom, right, bottom+size, dark_color),
+            (left+size*0.9, bottom+size*0.9, right-size*0.9, bottom+size, light_color),
+            (left, bottom, left+size*0.1, bottom+size, light_color),
+        )
 
     def make_background(self):
-        color = DARK_GREY * 4
-        dark_color = darken_color(DARK_GREY) * 4
-        light_color = lighten_color(DARK_GREY) * 4
-
-        # left wall
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left, self.bottom,
-                                self.left+self.block_size, self.bottom,
-                                self.left+self.block_size, self.top,
-                                self.left, self.top)),
-                       ('c4f', color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left, self.bottom,
-                                self.left+self.block_size, self.bottom,
-                                self.left+self.block_size, self.bottom+self.block_size*0.1,
-                                self.left, self.bottom+self.block_size*0.1)),
-                       ('c4f', dark_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left+self.block_size*0.9, self.bottom,
-                                self.left+self.block_size, self.bottom,
-                                self.left+self.block_size, self.top,
-                                self.left+self.block_size*0.9, self.top)),
-                       ('c4f', dark_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left, self.top-self.block_size*0.1,
-                                self.left+self.block_size, self.top-self.block_size*0.1,
-                                self.left+self.block_size, self.top,
-                                self.left, self.top)),
-                       ('c4f', light_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left, self.bottom,
-                                self.left+self.block_size*0.1, self.bottom,
-                                self.left+self.block_size*0.1, self.top,
-                                self.left, self.top)),
-                       ('c4f', light_color))
-
-        # right wall
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.right-self.block_size, self.bottom,
-                                self.right, self.bottom,
-                                self.right, self.top,
-                                self.right-self.block_size, self.top)),
-                       ('c4f', color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.right-self.block_size, self.bottom,
-                                self.right, self.bottom,
-                                self.right, self.bottom+self.block_size*0.1,
-                                self.right-self.block_size, self.bottom+self.block_size*0.1)),
-                       ('c4f', dark_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.right-self.block_size*0.1, self.bottom,
-                                self.right, self.bottom,
-                                self.right, self.top,
-                                self.right-self.block_size*0.1, self.top)),
-                       ('c4f', dark_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.right-self.block_size, self.top-self.block_size*0.1,
-                                self.right, self.top-self.block_size*0.1,
-                                self.right, self.top,
-                                self.right-self.block_size, self.top)),
-                       ('c4f', light_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.right-self.block_size, self.bottom,
-                                self.right-self.block_size*0.9, self.bottom,
-                                self.right-self.block_size*0.9, self.top,
-                                self.right-self.block_size, self.top)),
-                       ('c4f', light_color))
-
-        # bottom wall
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left, self.bottom,
-                                self.right, self.bottom,
-                                self.right, self.bottom+self.block_size,
-                                self.left, self.bottom+self.block_size)),
-                       ('c4f', color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left, self.bottom,
-                                self.right, self.bottom,
-                                self.right, self.bottom+self.block_size*0.1,
-                                self.left, self.bottom+self.block_size*0.1)),
-                       ('c4f', dark_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.right-self.block_size*0.1, self.bottom,
-                                self.right, self.bottom,
-                                self.right, self.bottom+self.block_size,
-                                self.right-self.block_size*0.1, self.bottom+self.block_size)),
-                       ('c4f', dark_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left+self.block_size*0.9, self.bottom+self.block_size*0.9,
-                                self.right-self.block_size*0.9, self.bottom+self.block_size*0.9,
-                                self.right-self.block_size*0.9, self.bottom+self.block_size,
-                                self.left+self.block_size*0.9, self.bottom+self.block_size)),
-                       ('c4f', light_color))
-        self.batch.add(4, GL_QUADS, None,
-                       ('v2f', (self.left, self.bottom,
-                                self.left+self.block_size*0.1, self.bottom,
-                                self.left+self.block_size*0.1, self.bottom+self.block_size,
-                                self.left, self.bottom+self.block_size)),
-                       ('c4f', light_color))
+        # one vertex list per quad, moved in place by layout_background()
+        self.background = [self.batch.add(4, GL_QUADS, None, 'v2f',
+                                          ('c4f', color * 4))
+                           for _, _, _, _, color in self.background_quads()]
+
+    def layout_background(self):
+        for vertex_list, (x0, y0, x1, y1, _) in zip(self.background,
+                                                    self.background_quads()):
+            vertex_list.vertices[:] = (x0, y0, x1, y0, x1, y1, x0, y1)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import pyglet
+
+DIGITS = '0123456789'
+
+
+# a static prefix label followed by a number drawn from digit glyphs that
+# are rendered once per font size; changing the value swaps only the
+# sprites of the digits that differ, without laying out any text
+class GlyphCounter(object):
+
+    def __init__(self, batch, prefix, x, y, font_size, color,
+                 font_name='Monofonto', group=None):
+        self.batch = batch
+        self.group = group
+        self.color = color
+        self.label = pyglet.text.Label(prefix, font_name=font_name,
+                                       font_size=font_size, color=color,
+                                       x=x, y=y, batch=batch, group=group)
+        self.font_name = font_name
+        self.prefix = prefix
+        self.load_glyphs(font_size)
+        self.x = x
+        self.y = y
+        self.sprites = []
+        self.text = ''
+        self.value = None
+
+    def load_glyphs(self, font_size):
+        self.font_size = font_size
+        font = pyglet.font.load(self.font_name, font_size)
+        self.glyphs = dict(zip(DIGITS, font.get_glyphs(DIGITS)))
+        self.prefix_width = sum(glyph.advance
+                                for glyph in font.get_glyphs(self.prefix))
+
+    def set(self, value):
+        if value == self.value:
+            return
+        self.value = value
+        text = str(value)
+        while len(self.sprites) < len(text):
+            sprite = pyglet.sprite.Sprite(self.glyphs['0'], batch=self.batch,
+                                          group=self.group)
+            sprite.color = self.color[:3]
+            self.sprites.append(sprite)
+        for i, sprite in enumerate(self.sprites):
+            if i >= len(text):
+                sprite.visible = False
+                continue
+            if i < len(self.text) and text[i] == self.text[i] and sprite.visible:
+                continue
+            self.place(sprite, i, text[i])
+        self.text = text
+
+    def place(self, sprite, i, digit):
+        glyph = self.glyphs[digit]
+        sprite.image = glyph
+        sprite.position = (self.x + self.prefix_width + i * glyph.advance + glyph.vertices[0],
+                           self.y + glyph.vertices[1])
+        sprite.visible = True
+
+    def move(self, x, y):
+        self.x = x
+        self.y = y
+        self.label.x = x
+        self.label.y = y
+        for i, sprite in enumerate(self.sprites):
+            if sprite.visible:
+                self.place(sprite, i, self.text[i])
+
+    def set_font_size(self, font_size):
+        # the digits are placed again by the next move()
+        if font_size == self.font_size:
+            return
+        self.load_glyphs(font_size)
+        self.label.font_size = font_size
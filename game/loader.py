@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+# runs named loading jobs one after another on a daemon thread; the window
+# polls done() from its clock callback and picks up results on the main
+# thread, where anything that needs the GL context is created
+class AssetLoader(object):
+
+    def __init__(self):
+        self.jobs = []
+        self.results = {}
+        self.errors = {}
+        self.times = {}
+        self.thread = None
+
+    def add(self, name, fn, *args):
+        self.jobs.append((name, fn, args))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='asset-loader')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        for name, fn, args in self.jobs:
+            start = time.perf_counter()
+            try:
+                result = fn(*args)
+            except Exception as e:
+                # re-raised by result() on the main thread
+                self.errors[name] = e
+            else:
+                self.results[name] = result
+            self.times[name] = time.perf_counter() - start
+
+    def done(self, name):
+        return name in self.times
+
+    def result(self, name):
+        if name in self.errors:
+            raise self.errors[name]
+        return self.results[name]
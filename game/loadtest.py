@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import argparse
+import asyncio
+import collections
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from game import engine
+from game import protocol
+from game.server import GameServer
+
+
+def serve(address, tick, ready):
+    server = GameServer(tick=tick, seed=0)
+    try:
+        asyncio.run(server.serve(address, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+async def open_connection(address):
+    address = protocol.parse_address(address)
+    if isinstance(address, tuple):
+        return await asyncio.open_connection(*address)
+    return await asyncio.open_unix_connection(address)
+
+
+# one simulated player: random inputs at `rate` per second, a restart
+# whenever its game ends; latency is from sending an input to receiving
+# the first state that includes it
+class Player(object):
+
+    def __init__(self, seed, rate):
+        self.rng = random.Random(seed)
+        self.rate = rate
+        self.seq = 0
+        self.pending = collections.deque()
+        self.latencies = []
+        self.frames = 0
+        self.restarts = 0
+
+    async def run(self, address, until):
+        reader, writer = await open_connection(address)
+        sender = asyncio.ensure_future(self.send_inputs(writer, until))
+        try:
+            await self.read_states(reader, writer, until)
+        finally:
+            sender.cancel()
+            writer.close()
+
+    def send(self, writer, kind, value=0):
+        self.seq += 1
+        self.pending.append((self.seq, time.perf_counter()))
+        writer.write(protocol.INPUT.pack(kind, self.seq, value))
+
+    async def send_inputs(self, writer, until):
+        while time.perf_counter() < until:
+            await asyncio.sleep(self.rng.expovariate(self.rate))
+            self.send(writer, protocol.ACTION, self.rng.choice(engine.ACTIONS[1:]))
+
+    async def read_states(self, reader, writer, until):
+        header = protocol.STATE_HEADER
+        restarting = False
+        while time.perf_counter() < until:
+            data = await reader.readexactly(header.size)
+            _, seq, flags, length = header.unpack(data)
+            await reader.readexactly(length)
+            now = time.perf_counter()
+            self.frames += 1
+            pending = self.pending
+            while pending and pending[0][0] <= seq:
+                self.latencies.append(now - pending.popleft()[1])
+            if flags & protocol.GAME_OVER:
+                if not restarting:
+                    restarting = True
+                    self.restarts += 1
+                    self.send(writer, protocol.RESTART)
+            else:
+                restarting = False
+
+
+async def run_players(address, sessions, seconds, rate, seed):
+    until = time.perf_counter() + seconds
+    players = [Player(seed + i, rate) for i in range(sessions)]
+    tasks = []
+    for player in players:
+        tasks.append(asyncio.ensure_future(player.run(address, until)))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return players
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+def run(address, sessions, seconds, rate, tick, seed=0):
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=serve, args=(address, tick, ready))
+    process.start()
+    ready.wait()
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    client_start = time.process_time()
+    start = time.perf_counter()
+    players = asyncio.run(run_players(address, sessions, seconds, rate, seed))
+    wall = time.perf_counter() - start
+    client_cpu = time.process_time() - client_start
+    process.terminate()
+    process.join()
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    server_cpu = (after.ru_utime + after.ru_stime
+                  - before.ru_utime - before.ru_stime)
+    latencies = [l for player in players for l in player.latencies]
+    frames = sum(player.frames for player in players)
+    load = server_cpu / wall
+    return {
+        'sessions': sessions,
+        'seconds': wall,
+        # share of one core the server used
+        'server_load': load,
+        'client_load': client_cpu / wall,
+        'sessions_per_core': sessions / load if load else float('inf'),
+        # states per session per second, against the tick rate
+        'state_rate': frames / float(sessions) / wall,
+        'tick_rate': 1.0 / tick,
+        'inputs': len(latencies),
+        'latency_p50_ms': percentile(latencies, 50) * 1000,
+        'latency_p99_ms': percentile(latencies, 99) * 1000,
+        'restarts': sum(player.restarts for player in players),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m game.loadtest')
+    parser.add_argument('-s', '--sessions', type=int, nargs='+',
+                        default=[50, 100, 200, 400])
+    parser.add_argument('-t', '--seconds', type=float, default=5.0)
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help='inputs per second per player')
+    parser.add_argument('--tick-rate', type=int, default=60)
+    parser.add_argument('--address', default=None,
+                        help='host:port or Unix socket path, default a '
+                             'temporary Unix socket')
+    args = parser.parse_args(argv)
+    address = args.address or os.path.join(tempfile.mkdtemp(), 'tetris.sock')
+
+    print('{:>8} {:>8} {:>8} {:>10} {:>8} {:>9} {:>9}'.format(
+        'sessions', 'server', 'client', 'per core', 'states/s', 'p50 ms', 'p99 ms'))
+    for sessions in args.sessions:
+        r = run(address, sessions, args.seconds, args.rate, 1.0 / args.tick_rate)
+        print('{:>8} {:>7.0%} {:>7.0%} {:>10.0f} {:>8.1f} {:>9.2f} {:>9.2f}'.format(
+            r['sessions'], r['server_load'], r['client_load'],
+            r['sessions_per_core'], r['state_rate'], r['latency_p50_ms'],
+            r['latency_p99_ms']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
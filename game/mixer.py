@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+
+# a fixed set of voices per effect, created when the effect is added; each
+# voice keeps its decoded source queued and is rewound instead of being
+# replaced, so playing a sound allocates nothing. Voices of one effect are
+# used round-robin, which always picks the least recently started one:
+# a free voice if there is any, otherwise the oldest still playing
+class SoundMixer(object):
+
+    def __init__(self, backend, default_limit=2):
+        self.backend = backend
+        self.default_limit = default_limit
+        # name -> [voices, index of the next voice]
+        self.effects = {}
+        self.enabled = True
+        self.play = self.trigger
+
+    def add(self, name, source, limit=None):
+        voices = [self.backend.voice(source)
+                  for _ in range(limit or self.default_limit)]
+        self.effects[name] = [voices, 0]
+
+    def trigger(self, name):
+        effect = self.effects.get(name)
+        if effect is None:
+            return
+        voices, i = effect
+        effect[1] = (i + 1) % len(voices)
+        voices[i].trigger()
+
+    def mute(self, name):
+        pass
+
+    def set_enabled(self, enabled):
+        # swaps play() itself, so a muted mixer costs one no-op call
+        self.enabled = enabled
+        if enabled:
+            self.play = self.trigger
+        else:
+            self.play = self.mute
+            self.stop()
+
+    def stop(self):
+        for voices, _ in self.effects.values():
+            for voice in voices:
+                voice.stop()
+
+
+class SilentVoice(object):
+
+    def __init__(self, source):
+        self.source = source
+        self.triggers = 0
+        self.playing = False
+
+    def trigger(self):
+        self.triggers += 1
+        self.playing = True
+
+    def stop(self):
+        self.playing = False
+
+
+# records what would be played; for headless runs and tests
+class SilentBackend(object):
+
+    def __init__(self):
+        self.voices = []
+
+    def voice(self, source):
+        voice = SilentVoice(source)
+        self.voices.append(voice)
+        return voice
+
+
+class PygletVoice(object):
+
+    def __init__(self, source):
+        import pyglet
+        self.player = pyglet.media.Player()
+        self.player.queue(source)
+        # stay paused on the finished source instead of dropping it, which
+        # is what the player does by default
+        self.player.push_handlers(on_source_group_eos=self.on_source_group_eos)
+
+    def on_source_group_eos(self):
+        self.player.pause()
+        return True
+
+    def trigger(self):
+        player = self.player
+        player.pause()
+        player.seek(0)
+        player.play()
+
+    def stop(self):
+        self.player.pause()
+
+
+# expects sources loaded with streaming=False, so rewinding a voice only
+# resets the read position of its decoded buffer
+class PygletBackend(object):
+
+    def voice(self, source):
+        return PygletVoice(source)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import collections
+import json
+import time
+
+FRAME = 'frame'
+
+
+class Phase(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+# per-phase frame timing: a rolling window of the last `window` frames for
+# the overlay plus log2 microsecond histograms of the whole run for dumps
+class FrameProfiler(object):
+
+    def __init__(self, window=240):
+        self.window = window
+        self.phases = {}
+        self.current = collections.defaultdict(float)
+        self.recent = collections.OrderedDict()
+        self.histograms = collections.OrderedDict()
+        self.last_frame = None
+        self.frames = 0
+        # one-off durations such as time to first frame, in seconds
+        self.marks = collections.OrderedDict()
+
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(self, name)
+        return phase
+
+    def add(self, name, seconds):
+        self.current[name] += seconds
+
+    def mark(self, name, seconds):
+        self.marks[name] = seconds
+
+    def idle(self):
+        # the next frame time would otherwise include the idle gap
+        self.last_frame = None
+
+    def end_frame(self):
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.current[FRAME] = now - self.last_frame
+        self.last_frame = now
+        for name, seconds in self.current.items():
+            self.sample(name, seconds)
+        self.current = collections.defaultdict(float)
+        self.frames += 1
+
+    def sample(self, name, seconds):
+        # also for measurements of their own rather than shares of a frame,
+        # such as the latency of one input
+        if name not in self.recent:
+            self.recent[name] = collections.deque(maxlen=self.window)
+            self.histograms[name] = collections.Counter()
+        self.recent[name].append(seconds)
+        self.histograms[name][int(seconds * 1e6).bit_length()] += 1
+
+    def percentiles(self, name, points=(50, 99)):
+        samples = sorted(self.recent.get(name, ()))
+        if not samples:
+            return tuple(0.0 for _ in points)
+        return tuple(samples[min(len(samples) - 1, len(samples) * p // 100)]
+                     for p in points)
+
+    def summary(self):
+        data = {}
+        for name, histogram in self.histograms.items():
+            count = sum(histogram.values())
+            data[name] = {
+                'count': count,
+                # bucket b holds samples below 2**b microseconds
+                'histogram_us': dict((str(2 ** b), histogram[b])
+                                     for b in sorted(histogram)),
+            }
+        return data
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump({'frames': self.frames, 'marks': self.marks,
+                       'phases': self.summary()}, f, indent=2)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pyglet
+from pyglet.gl import *
+
+from game.profiler import FRAME
+
+
+# rolling frame-time graph with a 60 Hz budget line and p50/p99 per phase
+class ProfilerOverlay(object):
+
+    def __init__(self, profiler, x, y, width=240, height=60, scale=1.0/20):
+        self.profiler = profiler
+        # size at scale 1, see move()
+        self.base_width = width
+        self.base_height = height
+        self.width = width
+        self.height = height
+        # frame time drawn at the full graph height, in seconds
+        self.scale = scale
+        self.visible = False
+        self.text_time = 0
+        self.graph = pyglet.graphics.vertex_list(
+            profiler.window, 'v2f', ('c4B', (230, 230, 230, 255) * profiler.window))
+        self.budget = pyglet.graphics.vertex_list(
+            2, 'v2f', ('c4B', (255, 128, 128, 255) * 2))
+        self.label = pyglet.text.Label('', font_name='Monofonto', font_size=12,
+                                       color=(230, 230, 230, 255),
+                                       width=width * 2,
+                                       anchor_y='top', multiline=True)
+        self.move(x, y)
+
+    def move(self, x, y, scale=1.0):
+        # scale resizes the graph and the text with the window's blocks
+        self.x = x
+        self.y = y
+        self.width = self.base_width * scale
+        self.height = self.base_height * scale
+        budget_y = y + self.height * min(1.0/60 / self.scale, 1.0)
+        self.budget.vertices[:] = (x, budget_y, x + self.width, budget_y)
+        self.label.begin_update()
+        self.label.font_size = 12 * scale
+        self.label.width = self.width * 2
+        self.label.x = x
+        self.label.y = y - 4 * scale
+        self.label.end_update()
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def draw(self):
+        if not self.visible:
+            return
+        samples = self.profiler.recent.get(FRAME)
+        if samples:
+            step = self.width / float(self.profiler.window)
+            vertices = []
+            for i, seconds in enumerate(samples):
+                vertices.append(self.x + i * step)
+                vertices.append(self.y + self.height * min(seconds / self.scale, 1.0))
+            vertices.extend(vertices[-2:] * (self.profiler.window - len(samples)))
+            self.graph.vertices[:] = vertices
+            self.graph.draw(GL_LINE_STRIP)
+        self.budget.draw(GL_LINES)
+
+        # relayout the text a few times a second, not every frame
+        now = time.perf_counter()
+        if now >= self.text_time:
+            self.text_time = now + 0.25
+            lines = []
+            for name in self.profiler.recent:
+                p50, p99 = self.profiler.percentiles(name)
+                lines.append('{:<11} p50 {:6.2f} ms  p99 {:6.2f} ms'.format(
+                    name, p50 * 1000, p99 * 1000))
+            self.label.text = '\n'.join(lines)
+        self.label.draw()
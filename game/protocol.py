@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import struct
+
+from game import engine
+
+# ''' game server protocol
+# client -> server: fixed INPUT frames, (kind, sequence number, value)
+#   ACTION:  value is an engine action
+#   RESTART: start a new game
+#   PAUSE:   value 1 stops the session's clock, 0 starts it again
+# server -> client: STATE_HEADER (kind, last applied input sequence number,
+#   flags, payload length) followed by the payload
+#   STATE:   payload is GameState.to_bytes() after a tick
+#   flags:   EVENT_BITS of the engine events of that tick, plus GAME_OVER
+#            once the game-over label is shown
+# '''
+
+INPUT = struct.Struct('<BIB')
+ACTION = 1
+RESTART = 2
+PAUSE = 3
+
+STATE_HEADER = struct.Struct('<BIBH')
+STATE = 1
+
+EVENT_BITS = (
+    (engine.ACTION_EVENT, 1),
+    (engine.ANCHOR_EVENT, 2),
+    (engine.FULL_LINE_EVENT, 4),
+    (engine.LEVEL_UP_EVENT, 8),
+)
+GAME_OVER = 0x80
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_events(events):
+    bits = 0
+    for event, bit in EVENT_BITS:
+        if event in events:
+            bits |= bit
+    return bits
+
+
+def decode_events(bits):
+    return [event for event, bit in EVENT_BITS if bits & bit]
+
+
+def parse_address(address):
+    # 'host:port' for TCP, anything else is a Unix socket path
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return address
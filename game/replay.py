@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import struct
+import sys
+import time
+
+from game.board import BitBoard
+from game.engine import TetrisEngine
+
+# ''' replay file
+# header: MAGIC, version (uint8), tick (float64), seed (uint64)
+# body:   one varint per input, (ticks since previous input << 3) | action
+# footer: varint (ticks since last input << 3) | END, varint final score
+# '''
+
+MAGIC = b'TTRP'
+VERSION = 1
+HEADER = struct.Struct('<BdQ')
+END = 7
+
+
+class ReplayError(Exception):
+    pass
+
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError('truncated replay')
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Recorder(object):
+
+    def __init__(self, seed, tick):
+        self.seed = seed
+        self.tick = tick
+        self.data = bytearray()
+        self.last_tick = 0
+
+    def record(self, tick, action):
+        write_varint(self.data, (tick - self.last_tick) << 3 | action)
+        self.last_tick = tick
+
+    def finish(self, tick, score):
+        data = bytearray(MAGIC)
+        data += HEADER.pack(VERSION, self.tick, self.seed)
+        data += self.data
+        write_varint(data, (tick - self.last_tick) << 3 | END)
+        write_varint(data, score)
+        return bytes(data)
+
+    def save(self, path, tick, score):
+        with open(path, 'wb') as f:
+            f.write(self.finish(tick, score))
+
+
+class Replay(object):
+
+    def __init__(self, seed, tick, inputs, end_tick, score):
+        self.seed = seed
+        self.tick = tick
+        # [(tick, action), ...] in tick order
+        self.inputs = inputs
+        self.end_tick = end_tick
+        self.score = score
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ReplayError('not a replay file')
+        pos = len(MAGIC)
+        if len(data) < pos + HEADER.size:
+            raise ReplayError('truncated replay')
+        version, tick, seed = HEADER.unpack_from(data, pos)
+        if version != VERSION:
+            raise ReplayError('unsupported replay version {}'.format(version))
+        pos += HEADER.size
+        inputs = []
+        current = 0
+        while True:
+            value, pos = read_varint(data, pos)
+            current += value >> 3
+            if value & 7 == END:
+                break
+            inputs.append((current, value & 7))
+        score, pos = read_varint(data, pos)
+        return cls(seed, tick, inputs, current, score)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def play(self, until=None, board_class=BitBoard, game=None):
+        # re-run the game headless as fast as possible, up to tick `until`;
+        # a given game must have been restarted with this replay's seed
+        if until is None:
+            until = self.end_tick
+        if game is None:
+            game = TetrisEngine(tick=self.tick, board_class=board_class,
+                                seed=self.seed)
+        inputs = self.inputs
+        i = 0
+        while game.ticks < until:
+            while i < len(inputs) and inputs[i][0] == game.ticks:
+                game.queue(inputs[i][1])
+                i += 1
+            game.run_tick()
+            game.events = []
+        return game
+
+    def seek(self, tick):
+        return self.play(until=min(tick, self.end_tick))
+
+    def verify(self):
+        return self.play().target_score == self.score
+
+
+def main(paths):
+    failed = 0
+    for path in paths:
+        replay = Replay.load(path)
+        start = time.perf_counter()
+        game = replay.play()
+        elapsed = time.perf_counter() - start
+        ok = game.target_score == replay.score
+        failed += not ok
+        print('{} {} ticks {} score {}/{} {:.0f} ticks/s'.format(
+            'ok  ' if ok else 'FAIL', path, game.ticks, game.target_score,
+            replay.score, game.ticks / max(elapsed, 1e-9)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
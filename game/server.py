@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+from game import protocol
+from game.engine import TetrisEngine
+
+# frames are dropped rather than queued once a client falls this far behind;
+# every STATE frame is a full state, so the next one replaces them
+MAX_BUFFERED = 64 * 1024
+
+
+# one game per connection. Its tick task keeps its own schedule on the
+# event loop, so sessions do not tick in lockstep; inputs are queued on
+# the engine and applied at the start of the next tick, after which the
+# state goes out tagged with the last input it includes
+class Session(object):
+
+    def __init__(self, reader, writer, tick, seed=None):
+        self.reader = reader
+        self.writer = writer
+        self.game = TetrisEngine(tick=tick, seed=seed)
+        self.seq = 0
+        self.paused = False
+        self.closed = False
+        # set by input, so an idle session sleeps until the client acts
+        self.wake = asyncio.Event()
+        self.frames = 0
+        self.dropped = 0
+
+    async def run(self):
+        reader = asyncio.ensure_future(self.read_inputs())
+        try:
+            await self.run_ticks()
+        finally:
+            self.closed = True
+            reader.cancel()
+            self.writer.close()
+
+    async def read_inputs(self):
+        try:
+            while True:
+                data = await self.reader.readexactly(protocol.INPUT.size)
+                kind, seq, value = protocol.INPUT.unpack(data)
+                self.seq = seq
+                if kind == protocol.ACTION:
+                    self.game.queue(value)
+                elif kind == protocol.RESTART:
+                    self.game.restart()
+                elif kind == protocol.PAUSE:
+                    self.paused = bool(value)
+                self.wake.set()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        self.closed = True
+        self.wake.set()
+
+    def idle(self):
+        # a finished game still ticks until its score has counted up
+        game = self.game
+        return self.paused or (game.show_game_over_label
+                               and game.score == game.target_score
+                               and not game.actions)
+
+    async def run_ticks(self):
+        loop = asyncio.get_event_loop()
+        tick = self.game.tick
+        next_time = loop.time()
+        while not self.closed:
+            if self.idle():
+                self.wake.clear()
+                await self.wake.wait()
+                next_time = loop.time()
+                if self.closed:
+                    break
+                if self.idle():
+                    # e.g. a pause or restart: show its result right away
+                    self.send_state()
+                    continue
+            next_time += tick
+            delay = next_time - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -8 * tick:
+                # drop the backlog rather than spiral after a long stall
+                next_time = loop.time()
+            self.game.run_tick()
+            self.send_state()
+
+    def send_state(self):
+        events = self.game.pop_events()
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+            self.dropped += 1
+            return
+        payload = self.game.snapshot().to_bytes()
+        flags = protocol.encode_events(events)
+        if self.game.show_game_over_label:
+            flags |= protocol.GAME_OVER
+        self.writer.write(protocol.STATE_HEADER.pack(
+            protocol.STATE, self.seq, flags, len(payload)) + payload)
+        self.frames += 1
+
+
+class GameServer(object):
+
+    def __init__(self, tick=1.0/60.0, seed=None):
+        self.tick = tick
+        # seeds of successive sessions, reproducible when seed is given
+        self.rng = random.Random(seed)
+        self.sessions = set()
+
+    async def handle(self, reader, writer):
+        session = Session(reader, writer, self.tick, self.rng.getrandbits(64))
+        self.sessions.add(session)
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(session)
+
+    async def start(self, address):
+        address = protocol.parse_address(address)
+        if isinstance(address, tuple):
+            return await asyncio.start_server(self.handle, *address)
+        if os.path.exists(address):
+            os.unlink(address)
+        return await asyncio.start_unix_server(self.handle, address)
+
+    async def serve(self, address, ready=None):
+        server = await self.start(address)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m game.server')
+    parser.add_argument('address', nargs='?', default='127.0.0.1:7777',
+                        help='host:port or a Unix socket path')
+    parser.add_argument('--tick-rate', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    server = GameServer(tick=1.0/args.tick_rate, seed=args.seed)
+    print('serving on ' + args.address)
+    try:
+        asyncio.run(server.serve(args.address))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import ctypes
+
+import pyglet
+from pyglet.gl import *
+
+from game.blocks import COLORS
+from game.sprite_renderer import SpriteBoardRenderer
+
+
+# GLSL 1.20, for old and software OpenGL drivers
+VERTEX_SHADER = b'''
+#version 120
+uniform vec2 board_size;
+varying vec2 cell;
+
+void main() {
+    gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+    cell = gl_MultiTexCoord0.st * board_size;
+}
+'''
+
+# the same bevel as BlockImagePattern: light left and top edges, dark bottom
+# and right edges, checked in that order
+FRAGMENT_SHADER = b'''
+#version 120
+uniform sampler2D cells;
+uniform vec2 board_size;
+uniform vec4 palette[8];
+varying vec2 cell;
+
+void main() {
+    vec2 texel = (floor(cell) + 0.5) / board_size;
+    int index = int(texture2D(cells, texel).r * 255.0 + 0.5);
+    if (index == 0)
+        discard;
+    vec4 color = palette[index];
+    vec4 light = min(color * 1.2, 1.0);
+    vec4 dark = color * 0.8;
+    vec2 f = fract(cell);
+    if (f.x <= 0.08)
+        color = light;
+    else if (f.y <= 0.08)
+        color = dark;
+    else if (f.y >= 0.92)
+        color = light;
+    else if (f.x >= 0.92)
+        color = dark;
+    gl_FragColor = vec4(color.rgb, 1.0);
+}
+'''
+
+
+class ShaderError(Exception):
+    pass
+
+
+def compile_shader(kind, source):
+    shader = glCreateShader(kind)
+    buffer = ctypes.create_string_buffer(source)
+    pointer = ctypes.cast(ctypes.pointer(ctypes.pointer(buffer)),
+                          ctypes.POINTER(ctypes.POINTER(GLchar)))
+    glShaderSource(shader, 1, pointer, None)
+    glCompileShader(shader)
+    status = GLint()
+    glGetShaderiv(shader, GL_COMPILE_STATUS, ctypes.byref(status))
+    if not status.value:
+        log = ctypes.create_string_buffer(4096)
+        glGetShaderInfoLog(shader, len(log), None, log)
+        raise ShaderError(log.value.decode(errors='replace'))
+    return shader
+
+
+def link_program(*shaders):
+    program = glCreateProgram()
+    for shader in shaders:
+        glAttachShader(program, shader)
+    glLinkProgram(program)
+    status = GLint()
+    glGetProgramiv(program, GL_LINK_STATUS, ctypes.byref(status))
+    if not status.value:
+        log = ctypes.create_string_buffer(4096)
+        glGetProgramInfoLog(program, len(log), None, log)
+        raise ShaderError(log.value.decode(errors='replace'))
+    return program
+
+
+def uniform_location(program, name):
+    return glGetUniformLocation(program, ctypes.create_string_buffer(name))
+
+
+class BoardShaderGroup(pyglet.graphics.Group):
+
+    def __init__(self, renderer, parent=None):
+        super(BoardShaderGroup, self).__init__(parent)
+        self.renderer = renderer
+
+    def set_state(self):
+        glUseProgram(self.renderer.program)
+        glActiveTexture(GL_TEXTURE0)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.renderer.texture.value)
+
+    def unset_state(self):
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+        glUseProgram(0)
+
+
+# the whole playfield as one textured quad: one luminance texel per cell
+# holds its color index and the fragment shader draws the block bevel, so
+# the cost per frame does not grow with the board size
+class ShaderBoardRenderer(SpriteBoardRenderer):
+
+    def create_cells(self):
+        self.program = link_program(compile_shader(GL_VERTEX_SHADER, VERTEX_SHADER),
+                                    compile_shader(GL_FRAGMENT_SHADER, FRAGMENT_SHADER))
+        glUseProgram(self.program)
+        glUniform1i(uniform_location(self.program, b'cells'), 0)
+        palette = [c for color in COLORS for c in color]
+        glUniform4fv(uniform_location(self.program, b'palette'), len(COLORS),
+                     (GLfloat * len(palette))(*palette))
+        glUseProgram(0)
+
+        self.texture = GLuint()
+        glGenTextures(1, ctypes.byref(self.texture))
+        self.board_width = self.width
+        self.board_height = self.height
+        self.allocate_texture()
+        self.quad = self.batch.add(4, GL_QUADS,
+                                   BoardShaderGroup(self, self.board_group),
+                                   'v2f', ('t2f', (0, 0, 1, 0, 1, 1, 0, 1)))
+        # the cells are texels, no sprite needs the block images
+        self.cell_sprites = ()
+        self.cell_colors = ()
+
+    def allocate_texture(self):
+        glBindTexture(GL_TEXTURE_2D, self.texture.value)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_LUMINANCE, self.board_width,
+                     self.board_height, 0, GL_LUMINANCE, GL_UNSIGNED_BYTE, None)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glUseProgram(self.program)
+        glUniform2f(uniform_location(self.program, b'board_size'),
+                    self.board_width, self.board_height)
+        glUseProgram(0)
+
+    def layout_cells(self):
+        left = self.left + self.block_size
+        bottom = self.bottom + self.block_size
+        right = left + self.board_width * self.block_size
+        top = bottom + self.board_height * self.block_size
+        self.quad.vertices[:] = (left, bottom, right, bottom,
+                                 right, top, left, top)
+
+    def update_board(self, board):
+        if board is not self.board:
+            self.board = board
+            if (board.width, board.height) != (self.board_width, self.board_height):
+                self.board_width = board.width
+                self.board_height = board.height
+                self.allocate_texture()
+                self.layout_cells()
+            rows = range(board.height)
+        else:
+            rows = board.pop_dirty_rows()
+        if not rows:
+            return
+        glBindTexture(GL_TEXTURE_2D, self.texture.value)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        # one upload per run of consecutive dirty rows
+        rows = sorted(rows)
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or rows[i] != rows[i - 1] + 1:
+                first, last = rows[start], rows[i - 1]
+                data = b''.join(board.row_colors(y) for y in range(first, last + 1))
+                glTexSubImage2D(GL_TEXTURE_2D, 0, 0, first, board.width,
+                                last - first + 1, GL_LUMINANCE, GL_UNSIGNED_BYTE,
+                                data)
+                start = i
+        glBindTexture(GL_TEXTURE_2D, 0)
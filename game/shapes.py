@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+
+# ''' SHAPE coordinate
+# -1, 1  0, 1  1, 1  2, 1
+# -1, 0  0, 0  1, 0  2, 0
+# -1,-1  0,-1  1,-1  2,-1
+# -1,-2  0,-2  1,-2  2,-2
+# '''
+
+SHAPES = [
+    ((-1, 0), (0, 0), (1, 0), (2, 0)),    # horizontal bar
+    ((0, 0), (1, 0), (0, -1), (1, -1)),   # square box
+    ((-1, 0), (0, 0), (1, 0), (0, -1)),   # T
+    ((0, 1), (0, 0), (0, -1), (1, -1)),   # L
+    ((1, 1), (1, 0), (1, -1), (0, -1)),   # reverse L
+    ((1, 1), (1, 0), (0, 0), (0, -1)),    # N
+    ((0, 1), (0, 0), (1, 0), (1, -1)),    # reverse N
+]
+
+# cells: offsets from the piece position
+# min_x, max_x, min_y, max_y: bounding box of the offsets
+# bottom: ((dx, lowest dy), ...) for every column the piece covers
+# row_masks: ((dy, mask), ...), bit i of mask is column min_x + i
+Rotation = namedtuple('Rotation', ['shape', 'rotation', 'cells',
+                                   'min_x', 'max_x', 'min_y', 'max_y',
+                                   'bottom', 'row_masks'])
+
+
+def rotate(cells):
+    return tuple((pos[1] * -1, pos[0] - 1) for pos in cells)
+
+
+def make_rotation(shape, rotation, cells):
+    xs = [pos[0] for pos in cells]
+    ys = [pos[1] for pos in cells]
+    min_x = min(xs)
+    bottom = {}
+    masks = {}
+    for x, y in cells:
+        bottom[x] = min(bottom.get(x, y), y)
+        masks[y] = masks.get(y, 0) | 1 << (x - min_x)
+    return Rotation(shape, rotation, cells, min_x, max(xs), min(ys), max(ys),
+                    tuple(sorted(bottom.items())), tuple(sorted(masks.items())))
+
+
+def make_rotations():
+    table = []
+    for shape, cells in enumerate(SHAPES):
+        rotations = []
+        for rotation in range(4):
+            rotations.append(make_rotation(shape, rotation, cells))
+            cells = rotate(cells)
+        table.append(tuple(rotations))
+    return tuple(table)
+
+
+# ROTATIONS[shape][rotation], rotation 1 is one press of UP
+ROTATIONS = make_rotations()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import pyglet
+
+from game.board import BOARD_WIDTH, BOARD_HEIGHT
+from game.shapes import SHAPES
+
+
+# retained-mode playfield: one sprite per board cell plus the player, ghost
+# and next shape sprites, all in one batch; only changed cells are touched
+class SpriteBoardRenderer(object):
+
+    def __init__(self, batch, block_images, ghost_images, width=BOARD_WIDTH,
+                 height=BOARD_HEIGHT):
+        # board size in cells
+        self.width = width
+        self.height = height
+        self.batch = batch
+        self.block_images = block_images
+        self.ghost_images = ghost_images
+        self.board_group = pyglet.graphics.OrderedGroup(0)
+        ghost_group = pyglet.graphics.OrderedGroup(1)
+        player_group = pyglet.graphics.OrderedGroup(2)
+        self.create_cells()
+        self.ghost_sprites = [self.make_sprite(ghost_group) for _ in range(4)]
+        self.player_sprites = [self.make_sprite(player_group) for _ in range(4)]
+        self.next_sprites = [self.make_sprite(player_group) for _ in range(4)]
+        self.board = None
+        self.player_state = None
+        self.next_state = None
+
+    def make_sprite(self, group):
+        sprite = pyglet.sprite.Sprite(self.block_images[0], batch=self.batch,
+                                      group=group)
+        sprite.visible = False
+        return sprite
+
+    def create_cells(self):
+        self.cell_sprites = [self.make_sprite(self.board_group)
+                             for _ in range(self.width * self.height)]
+        self.cell_colors = [0] * (self.width * self.height)
+
+    def layout(self, left, bottom, block_size, next_left, next_bottom):
+        self.left = left
+        self.bottom = bottom
+        self.block_size = block_size
+        self.next_left = next_left
+        self.next_bottom = next_bottom
+        self.layout_cells()
+        self.player_state = None
+        self.next_state = None
+
+    def set_images(self, block_images, ghost_images):
+        # e.g. for a new block size; the player and next shape sprites get
+        # them with the next layout()
+        self.block_images = block_images
+        self.ghost_images = ghost_images
+        for sprite, color in zip(self.cell_sprites, self.cell_colors):
+            if color:
+                sprite.image = block_images[color]
+
+    def layout_cells(self):
+        for i, sprite in enumerate(self.cell_sprites):
+            sprite.position = (self.left + (i % self.width + 1) * self.block_size,
+                               self.bottom + (i // self.width + 1) * self.block_size)
+
+    def update(self, game):
+        self.update_board(game.board)
+        self.update_player(game)
+        self.update_next_shape(game)
+
+    def update_board(self, board):
+        if board is not self.board:
+            self.board = board
+            rows = range(self.height)
+        else:
+            rows = board.pop_dirty_rows()
+        for y in rows:
+            for x in range(self.width):
+                i = x + y * self.width
+                color = board.get(x, y)
+                if color != self.cell_colors[i]:
+                    self.cell_colors[i] = color
+                    sprite = self.cell_sprites[i]
+                    if color:
+                        sprite.image = self.block_images[color]
+                    sprite.visible = color != 0
+
+    def update_player(self, game):
+        visible = game.player_control and not game.game_over
+        if visible:
+            state = (game.interpolated_pos(), game.player_shape,
+                     game.player_color, game.landing_y())
+        else:
+            state = None
+        if state == self.player_state:
+            return
+        self.player_state = state
+        for sprite in self.player_sprites + self.ghost_sprites:
+            sprite.visible = False
+        if state is None:
+            return
+        (player_x, player_y), shape, color, ghost_y = state
+        for pos, sprite, ghost in zip(shape, self.player_sprites, self.ghost_sprites):
+            x = self.left + (player_x + pos[0] + 1) * self.block_size
+            sprite.image = self.block_images[color]
+            sprite.position = (x, self.bottom + (player_y + pos[1] + 1) * self.block_size)
+            sprite.visible = True
+            if ghost_y != game.player_pos[1]:
+                ghost.image = self.ghost_images[color]
+                ghost.position = (x, self.bottom + (ghost_y + pos[1] + 1) * self.block_size)
+                ghost.visible = True
+
+    def update_next_shape(self, game):
+        state = (game.next_shape, game.next_color)
+        if state == self.next_state:
+            return
+        self.next_state = state
+        for pos, sprite in zip(SHAPES[game.next_shape], self.next_sprites):
+            sprite.image = self.block_images[game.next_color]
+            sprite.position = (self.next_left + pos[0] * self.block_size,
+                               self.next_bottom + pos[1] * self.block_size)
+            sprite.visible = True
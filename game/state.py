@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import random
+import struct
+
+from game.board import BOARD_WIDTH, BOARD_HEIGHT
+from game.shapes import ROTATIONS
+
+# ''' serialized state
+# header: STATE_HEADER, see to_bytes() for the field order
+# board:  BOARD_HEIGHT uint16 row bitmasks, then the cell colors packed two
+#         per byte, low nibble first
+# queue:  one byte per queued action
+# The random stream is stored as its seed; from_bytes() rebuilds it by
+# redrawing the two numbers next_player() takes for every piece so far.
+# '''
+
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct('<BQIIIIIIHidddBBbbBBBBBBHBB4BbbI')
+PLAYER_CONTROL = 1
+GAME_OVER = 2
+SHOW_GAME_OVER_LABEL = 4
+
+# engine attributes copied as they are; all of them are immutable values
+FIELDS = ('seed', 'ticks', 'pieces', 'lines', 'score', 'target_score',
+          'high_score', 'level', 'points_to_next_level', 'count_down',
+          'state_time', 'accumulator', 'player_piece', 'player_color',
+          'next_shape', 'next_color', 'player_control', 'game_over',
+          'game_over_animation_count', 'show_game_over_label',
+          'full_line_anim_x', 'full_line_anim_y', 'previous_piece')
+
+
+class StateError(Exception):
+    pass
+
+
+# everything TetrisEngine needs to resume a game. The board is a board
+# snapshot whose rows are shared copy-on-write with the live board, and the
+# random state is shared by every snapshot taken during the same piece, so
+# a snapshot is one small object plus a few tuples of pointers
+class GameState(object):
+
+    __slots__ = FIELDS + ('board', 'rng_state', 'player_pos', 'full_lines',
+                          'actions', 'previous_pos')
+
+    @classmethod
+    def capture(cls, game):
+        state = cls()
+        for name in FIELDS:
+            setattr(state, name, getattr(game, name))
+        state.board = game.board.snapshot()
+        if game.rng_state is None:
+            game.rng_state = game.rng.getstate()
+        state.rng_state = game.rng_state
+        state.player_pos = tuple(game.player_pos)
+        state.full_lines = tuple(game.full_lines)
+        state.actions = tuple(game.actions)
+        state.previous_pos = game.previous_pos
+        return state
+
+    def apply(self, game):
+        for name in FIELDS:
+            setattr(game, name, getattr(self, name))
+        game.board.restore(self.board)
+        if self.rng_state is not None:
+            game.rng.setstate(self.rng_state)
+        game.rng_state = self.rng_state
+        game.player_pos = list(self.player_pos)
+        game.full_lines = list(self.full_lines)
+        game.actions = list(self.actions)
+        game.previous_pos = self.previous_pos
+        game.events = []
+
+    def to_bytes(self):
+        if self.seed is None:
+            raise StateError('games on a shared random stream have no seed '
+                             'to serialize')
+        if not isinstance(self.seed, int) or not 0 <= self.seed < 1 << 64:
+            raise StateError('only uint64 seeds can be serialized, not '
+                             '{!r}'.format(self.seed))
+        if len(self.full_lines) > 4:
+            raise StateError('at most 4 full lines can be serialized, not '
+                             '{}'.format(len(self.full_lines)))
+        rows, colors, _ = self.board
+        if len(rows) != BOARD_HEIGHT or len(colors[0]) != BOARD_WIDTH:
+            raise StateError('only {}x{} boards can be serialized'.format(
+                BOARD_WIDTH, BOARD_HEIGHT))
+        flags = (PLAYER_CONTROL * self.player_control
+                 | GAME_OVER * self.game_over
+                 | SHOW_GAME_OVER_LABEL * self.show_game_over_label)
+        full_lines = tuple(self.full_lines) + (0,) * (4 - len(self.full_lines))
+        try:
+            header = STATE_HEADER.pack(
+                STATE_VERSION, self.seed, self.ticks, self.pieces, self.lines,
+                self.score, self.target_score, self.high_score, self.level,
+                self.points_to_next_level, self.count_down, self.state_time,
+                self.accumulator, self.player_piece.shape,
+                self.player_piece.rotation, self.player_pos[0],
+                self.player_pos[1], self.player_color, self.next_shape,
+                self.next_color, flags,
+                self.full_line_anim_x, self.full_line_anim_y,
+                self.game_over_animation_count, len(self.actions),
+                len(self.full_lines), *full_lines,
+                self.previous_pos[0], self.previous_pos[1],
+                self.previous_piece)
+        except struct.error as e:
+            # e.g. a counter past its field size after a very long game
+            raise StateError('state does not fit the format: {}'.format(e))
+        data = bytearray(header)
+        data += struct.pack('<{}H'.format(BOARD_HEIGHT), *rows)
+        cells = b''.join(bytes(row) for row in colors)
+        data += bytes(a | b << 4 for a, b in zip(cells[::2], cells[1::2]))
+        data += bytes(self.actions)
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data, rng=True):
+        # rng=False skips rebuilding the random stream, for states that are
+        # only displayed; applying such a state leaves the engine's rng as is
+        if not data or data[0] != STATE_VERSION:
+            raise StateError('unsupported state version')
+        (_, seed, ticks, pieces, lines, score, target_score, high_score, level,
+         points_to_next_level, count_down, state_time, accumulator, shape,
+         rotation, x, y, color, next_shape, next_color, flags, anim_x, anim_y,
+         game_over_count, action_count, full_line_count, line0, line1, line2,
+         line3, previous_x, previous_y,
+         previous_piece) = STATE_HEADER.unpack_from(data)
+        pos = STATE_HEADER.size
+        rows = struct.unpack_from('<{}H'.format(BOARD_HEIGHT), data, pos)
+        pos += 2 * BOARD_HEIGHT
+        packed = data[pos:pos + BOARD_WIDTH * BOARD_HEIGHT // 2]
+        pos += len(packed)
+        cells = bytearray(BOARD_WIDTH * BOARD_HEIGHT)
+        cells[::2] = bytes(b & 15 for b in packed)
+        cells[1::2] = bytes(b >> 4 for b in packed)
+        colors = tuple(bytes(cells[i:i + BOARD_WIDTH])
+                       for i in range(0, len(cells), BOARD_WIDTH))
+        heights = [0] * BOARD_WIDTH
+        for row_y, row in enumerate(rows):
+            for column in range(BOARD_WIDTH):
+                if row >> column & 1:
+                    heights[column] = row_y + 1
+
+        rng_state = None
+        if rng:
+            stream = random.Random(seed)
+            # restart() draws one pair, next_player() one more per piece
+            for _ in range(pieces + 1):
+                stream.randint(0, 6)
+                stream.randint(1, 4)
+            rng_state = stream.getstate()
+
+        state = cls()
+        state.seed = seed
+        state.ticks = ticks
+        state.pieces = pieces
+        state.lines = lines
+        state.score = score
+        state.target_score = target_score
+        state.high_score = high_score
+        state.level = level
+        state.points_to_next_level = points_to_next_level
+        state.count_down = count_down
+        state.state_time = state_time
+        state.accumulator = accumulator
+        state.player_piece = ROTATIONS[shape][rotation]
+        state.player_color = color
+        state.next_shape = next_shape
+        state.next_color = next_color
+        state.player_control = bool(flags & PLAYER_CONTROL)
+        state.game_over = bool(flags & GAME_OVER)
+        state.show_game_over_label = bool(flags & SHOW_GAME_OVER_LABEL)
+        state.game_over_animation_count = game_over_count
+        state.full_line_anim_x = anim_x
+        state.full_line_anim_y = anim_y
+        state.previous_piece = previous_piece
+        state.board = (rows, colors, tuple(heights))
+        state.rng_state = rng_state
+        state.player_pos = (x, y)
+        state.full_lines = (line0, line1, line2, line3)[:full_line_count]
+        state.actions = tuple(data[pos:pos + action_count])
+        state.previous_pos = (previous_x, previous_y)
+        return state
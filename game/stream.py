@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+
+from game import protocol
+from game.board import BOARD_WIDTH, BOARD_HEIGHT
+from game.engine import TetrisEngine
+from game.replay import read_varint, write_varint
+from game.shapes import ROTATIONS
+
+# ''' stream frame, one per tick
+# flags (uint8), then the fields whose flag is set, in this order:
+# ROWS:   uint24 mask of changed rows, then per row its 10 colors packed
+#         two per byte, low nibble first
+# PIECE:  uint8 shape | rotation << 4, int8 x, int8 y, uint8 color
+# NEXT:   uint8 next shape | next color << 4
+# SCORE:  zigzag varint, change of the displayed score
+# LEVEL:  varint level
+# STATUS: uint8 game over | label shown << 1, varint high score
+# EVENTS: uint8 protocol.EVENT_BITS of the tick
+# A KEYFRAME carries every field and every row and does not depend on
+# earlier frames; a spectator can start decoding at any keyframe.
+# '''
+
+ROWS = 1
+PIECE = 2
+NEXT = 4
+SCORE = 8
+LEVEL = 16
+STATUS = 32
+EVENTS = 64
+KEYFRAME = 128
+
+ALL_ROWS = (1 << BOARD_HEIGHT) - 1
+
+
+class StreamError(Exception):
+    pass
+
+
+def pack_row(colors):
+    return bytes(a | b << 4 for a, b in zip(colors[::2], colors[1::2]))
+
+
+def unpack_row(data):
+    row = bytearray(BOARD_WIDTH)
+    row[::2] = bytes(b & 15 for b in data)
+    row[1::2] = bytes(b >> 4 for b in data)
+    return row
+
+
+# turns a running game into frames; the board is compared with a
+# copy-on-write snapshot of the previous frame, in which rows that were not
+# written since are the very same objects, so most rows cost an identity check
+class StreamEncoder(object):
+
+    def __init__(self, keyframe_interval=120):
+        self.keyframe_interval = keyframe_interval
+        self.colors = None
+        self.since_keyframe = 0
+        self.ticks = None
+        self.piece = None
+        self.next = None
+        self.score = 0
+        self.level = None
+        self.status = None
+
+    def request_keyframe(self):
+        # e.g. when a spectator joins
+        self.colors = None
+
+    def encode(self, game, events=()):
+        _, colors, _ = game.board.snapshot()
+        keyframe = (self.colors is None or game.ticks < self.ticks
+                    or self.since_keyframe >= self.keyframe_interval)
+        self.ticks = game.ticks
+        out = bytearray(1)
+        flags = 0
+        if keyframe:
+            flags = KEYFRAME
+            self.since_keyframe = 0
+            self.piece = self.next = self.level = self.status = None
+            self.score = 0
+            mask = ALL_ROWS
+        else:
+            self.since_keyframe += 1
+            previous = self.colors
+            mask = 0
+            for y in range(BOARD_HEIGHT):
+                row = colors[y]
+                if row is not previous[y] and row != previous[y]:
+                    mask |= 1 << y
+        self.colors = colors
+        if mask:
+            flags |= ROWS
+            out += mask.to_bytes(3, 'little')
+            for y in range(BOARD_HEIGHT):
+                if mask >> y & 1:
+                    out += pack_row(colors[y])
+
+        piece = game.player_piece
+        value = (piece.shape | piece.rotation << 4, game.player_pos[0],
+                 game.player_pos[1], game.player_color)
+        if value != self.piece:
+            flags |= PIECE
+            self.piece = value
+            out += bytes((value[0], value[1] & 0xff, value[2] & 0xff, value[3]))
+        value = game.next_shape | game.next_color << 4
+        if value != self.next:
+            flags |= NEXT
+            self.next = value
+            out.append(value)
+        if game.score != self.score:
+            flags |= SCORE
+            delta = game.score - self.score
+            write_varint(out, delta << 1 if delta >= 0 else (-delta << 1) - 1)
+            self.score = game.score
+        if game.level != self.level:
+            flags |= LEVEL
+            self.level = game.level
+            write_varint(out, game.level)
+        value = (game.game_over | game.show_game_over_label << 1, game.high_score)
+        if value != self.status:
+            flags |= STATUS
+            self.status = value
+            out.append(value[0])
+            write_varint(out, value[1])
+        if events:
+            flags |= EVENTS
+            out.append(protocol.encode_events(events))
+        out[0] = flags
+        return bytes(out)
+
+
+def signed(byte):
+    return byte - 256 if byte > 127 else byte
+
+
+# rebuilds the display state of the encoded game in a TetrisEngine that is
+# never advanced, so the usual renderers can draw it; frames before the
+# first keyframe are skipped
+class StreamDecoder(object):
+
+    def __init__(self, game=None):
+        self.game = game or TetrisEngine()
+        self.synced = False
+        self.frames = 0
+
+    def decode(self, data, pos=0):
+        # applies the frame at data[pos:], returns the position after it
+        game = self.game
+        if pos >= len(data):
+            raise StreamError('truncated frame')
+        flags = data[pos]
+        pos += 1
+        if flags & KEYFRAME:
+            self.synced = True
+            game.score = 0
+        apply = self.synced
+        try:
+            if flags & ROWS:
+                mask = int.from_bytes(data[pos:pos + 3], 'little')
+                pos += 3
+                board = game.board
+                for y in range(BOARD_HEIGHT):
+                    if mask >> y & 1:
+                        if apply:
+                            row = unpack_row(data[pos:pos + BOARD_WIDTH // 2])
+                            for x in range(BOARD_WIDTH):
+                                if board.get(x, y) != row[x]:
+                                    board.set(x, y, row[x])
+                        pos += BOARD_WIDTH // 2
+            if flags & PIECE:
+                if apply:
+                    shape_rotation = data[pos]
+                    game.player_piece = ROTATIONS[shape_rotation & 15][shape_rotation >> 4]
+                    game.player_pos = [signed(data[pos + 1]), signed(data[pos + 2])]
+                    game.previous_pos = tuple(game.player_pos)
+                    game.player_color = data[pos + 3]
+                pos += 4
+            if flags & NEXT:
+                if apply:
+                    game.next_shape = data[pos] & 15
+                    game.next_color = data[pos] >> 4
+                pos += 1
+            if flags & SCORE:
+                value, pos = read_varint(data, pos)
+                if apply:
+                    game.score += value >> 1 if not value & 1 else -((value + 1) >> 1)
+                    game.target_score = game.score
+            if flags & LEVEL:
+                value, pos = read_varint(data, pos)
+                if apply:
+                    game.level = value
+            if flags & STATUS:
+                status = data[pos]
+                high_score, pos = read_varint(data, pos + 1)
+                if apply:
+                    game.game_over = bool(status & 1)
+                    game.show_game_over_label = bool(status & 2)
+                    game.high_score = high_score
+            if flags & EVENTS:
+                if apply:
+                    game.events.extend(protocol.decode_events(data[pos]))
+                pos += 1
+        except IndexError:
+            raise StreamError('truncated frame')
+        self.frames += 1
+        return pos
+
+
+def benchmark(ticks=7200, seed=0):
+    # an autoplayed game at full speed, restarted when it ends
+    from game.ai import AutoPlayer
+    from game.state import GameState
+    player = AutoPlayer(lookahead=False)
+    game = TetrisEngine(seed=seed)
+    encoder = StreamEncoder()
+    frames = []
+    encode_time = 0.0
+    keyframes = 0
+    for _ in range(ticks):
+        events = game.step(player.act(game))
+        if game.show_game_over_label:
+            game.restart(seed)
+        start = time.perf_counter()
+        frame = encoder.encode(game, events)
+        encode_time += time.perf_counter() - start
+        keyframes += frame[0] >> 7
+        frames.append(frame)
+    decoder = StreamDecoder()
+    start = time.perf_counter()
+    for frame in frames:
+        decoder.decode(frame)
+    decode_time = time.perf_counter() - start
+    ok = (list(decoder.game.board.cells()) == list(game.board.cells())
+          and decoder.game.score == game.score)
+
+    seconds = ticks * game.tick
+    size = sum(len(frame) for frame in frames)
+    state_size = len(GameState.capture(game).to_bytes())
+    return {
+        'ticks': ticks,
+        'keyframes': keyframes,
+        'stream_bytes_per_second': size / seconds,
+        'state_bytes_per_second': state_size * ticks / seconds,
+        'board_bytes_per_second': BOARD_WIDTH * BOARD_HEIGHT * ticks / seconds,
+        'encode_us_per_tick': encode_time / ticks * 1e6,
+        'decode_us_per_tick': decode_time / ticks * 1e6,
+        'decoded_matches': ok,
+    }
+
+
+if __name__ == '__main__':
+    results = benchmark(*map(int, sys.argv[1:2]))
+    for name, value in sorted(results.items()):
+        print('{:<26} {}'.format(name, round(value, 2)))
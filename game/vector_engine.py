@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+import random
+import time
+
+import numpy as np
+
+from game import engine
+from game.board import BOARD_WIDTH, BOARD_HEIGHT
+from game.shapes import ROTATIONS
+
+
+# CELL_X[shape, rotation] and CELL_Y[shape, rotation] hold the 4 cell offsets
+CELL_X = np.array([[[pos[0] for pos in r.cells] for r in rotations]
+                   for rotations in ROTATIONS], dtype=np.int64)
+CELL_Y = np.array([[[pos[1] for pos in r.cells] for r in rotations]
+                   for rotations in ROTATIONS], dtype=np.int64)
+
+ROWS = np.arange(BOARD_HEIGHT)
+
+
+# N games of TetrisEngine rules stepped in lockstep, one action per game
+# per tick; boards live in a single (N, 20, 10) uint8 array
+class VectorEngine(object):
+
+    def __init__(self, n, seeds=None, tick=1.0/60.0, autoreset=True):
+        if seeds is None:
+            seeds = range(n)
+        self.n = n
+        self.tick = tick
+        self.autoreset = autoreset
+        self.rngs = [random.Random(seed) for seed in seeds]
+
+        self.board = np.zeros((n, BOARD_HEIGHT, BOARD_WIDTH), dtype=np.uint8)
+        self.player_x = np.zeros(n, dtype=np.int64)
+        self.player_y = np.zeros(n, dtype=np.int64)
+        self.player_shape = np.zeros(n, dtype=np.int64)
+        self.player_rotation = np.zeros(n, dtype=np.int64)
+        self.player_color = np.zeros(n, dtype=np.uint8)
+        self.next_shape = np.zeros(n, dtype=np.int64)
+        self.next_color = np.zeros(n, dtype=np.uint8)
+
+        self.game_over = np.zeros(n, dtype=bool)
+        self.game_over_animation_count = np.zeros(n, dtype=np.int64)
+        self.show_game_over_label = np.zeros(n, dtype=bool)
+        self.player_control = np.zeros(n, dtype=bool)
+        self.full_rows = np.zeros((n, BOARD_HEIGHT), dtype=bool)
+        self.full_lines = np.zeros((n, 4), dtype=np.int64)
+        self.full_line_count = np.zeros(n, dtype=np.int64)
+        self.full_line_anim_x = np.zeros(n, dtype=np.int64)
+        self.full_line_anim_y = np.zeros(n, dtype=np.int64)
+
+        self.level = np.zeros(n, dtype=np.int64)
+        self.count_down = np.zeros(n, dtype=np.float64)
+        self.state_time = np.zeros(n, dtype=np.float64)
+        self.points_to_next_level = np.zeros(n, dtype=np.int64)
+        self.high_score = np.zeros(n, dtype=np.int64)
+        self.target_score = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.lines = np.zeros(n, dtype=np.int64)
+        self.basic_score = 100
+        self.full_line_score = 1000
+        self.score_add_step = 10
+        # the level curve of TetrisEngine, shared by all N games
+        self.level_score = 10000
+        self.level_score_step = 1000
+        self.fall_time = 2
+        self.fall_time_step = 0.1
+        self.min_fall_time = 0.1
+
+        self.games_finished = 0
+        self.restart(np.arange(n))
+
+    def restart(self, idx):
+        self.board[idx] = 0
+        self.game_over[idx] = False
+        self.game_over_animation_count[idx] = 0
+        self.show_game_over_label[idx] = False
+        self.player_control[idx] = True
+        self.full_rows[idx] = False
+        self.full_line_count[idx] = 0
+        self.full_line_anim_x[idx] = 0
+        self.full_line_anim_y[idx] = 0
+        self.level[idx] = 1
+        self.count_down[idx] = self.fall_time
+        self.state_time[idx] = self.count_down[idx]
+        self.points_to_next_level[idx] = self.level_score
+        self.high_score[idx] = np.maximum(self.high_score[idx],
+                                          self.target_score[idx])
+        self.target_score[idx] = 0
+        self.score[idx] = 0
+        self.lines[idx] = 0
+        for i in idx:
+            self.next_shape[i] = self.rngs[i].randint(0, 6)
+            self.next_color[i] = self.rngs[i].randint(1, 4)
+        self.next_player(idx)
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        self.apply(actions)
+        self.update(self.tick)
+        done = np.flatnonzero(self.show_game_over_label)
+        self.games_finished += done.size
+        if self.autoreset and done.size:
+            self.restart(done)
+        return done
+
+    def apply(self, actions):
+        controlled = self.player_control
+        idx = np.flatnonzero(controlled & (actions == engine.LEFT))
+        ok = idx[~self.collides(idx, self.player_x[idx] - 1, self.player_y[idx],
+                                self.player_rotation[idx])]
+        self.player_x[ok] -= 1
+
+        idx = np.flatnonzero(controlled & (actions == engine.RIGHT))
+        ok = idx[~self.collides(idx, self.player_x[idx] + 1, self.player_y[idx],
+                                self.player_rotation[idx])]
+        self.player_x[ok] += 1
+
+        idx = np.flatnonzero(controlled & (actions == engine.ROTATE))
+        rotation = (self.player_rotation[idx] + 1) % 4
+        ok = ~self.collides(idx, self.player_x[idx], self.player_y[idx], rotation)
+        self.player_rotation[idx[ok]] = rotation[ok]
+
+        down = np.flatnonzero(controlled & (actions == engine.DOWN))
+        drop = np.flatnonzero(controlled & (actions == engine.DROP))
+        self.check_down(down)
+        self.direct_down(drop)
+
+    def update(self, delta):
+        ticking = self.score < self.target_score
+        self.score[ticking] = np.minimum(self.score[ticking] + self.score_add_step,
+                                         self.target_score[ticking])
+        np.maximum(self.high_score, self.score, out=self.high_score)
+
+        animating = self.full_line_count > 0
+        if animating.any():
+            self.player_control[animating] = False
+            self.remove_full_line_animation(animating)
+
+        if self.game_over.any():
+            self.do_game_over_animation(self.game_over)
+
+        alive = ~self.game_over
+        self.state_time[alive] -= delta
+        self.check_down(np.flatnonzero(alive & (self.state_time <= 0)))
+
+    def collides(self, idx, x, y, rotation):
+        shape = self.player_shape[idx]
+        xs = x[:, None] + CELL_X[shape, rotation]
+        ys = y[:, None] + CELL_Y[shape, rotation]
+        outside = (xs < 0) | (xs >= BOARD_WIDTH) | (ys < 0)
+        cells = self.board[idx[:, None],
+                           np.clip(ys, 0, BOARD_HEIGHT - 1),
+                           np.clip(xs, 0, BOARD_WIDTH - 1)]
+        return (outside | (cells != 0)).any(axis=1)
+
+    def check_down(self, idx):
+        if not idx.size:
+            return
+        hit = self.collides(idx, self.player_x[idx], self.player_y[idx] - 1,
+                            self.player_rotation[idx])
+        self.player_y[idx[~hit]] -= 1
+        locked = idx[hit]
+        if locked.size:
+            self.lock(locked)
+        self.state_time[idx] = self.count_down[idx]
+        self.check_game_over(idx)
+
+    def direct_down(self, idx):
+        falling = idx
+        while falling.size:
+            hit = self.collides(falling, self.player_x[falling],
+                                self.player_y[falling] - 1,
+                                self.player_rotation[falling])
+            falling = falling[~hit]
+            self.player_y[falling] -= 1
+        self.check_down(idx)
+
+    def lock(self, idx):
+        shape = self.player_shape[idx]
+        rotation = self.player_rotation[idx]
+        y = self.player_y[idx]
+        xs = self.player_x[idx, None] + CELL_X[shape, rotation]
+        ys = y[:, None] + CELL_Y[shape, rotation]
+        self.board[idx[:, None], ys, xs] = self.player_color[idx, None]
+        self.add_score(idx, self.basic_score)
+        self.check_full_lines(idx, np.minimum(ys.min(axis=1), y),
+                              np.maximum(ys.max(axis=1), y))
+        self.next_player(idx)
+
+    def check_full_lines(self, idx, min_y, max_y):
+        board = self.board[idx]
+        full = (board != 0).all(axis=2) \
+            & (ROWS >= min_y[:, None]) & (ROWS <= max_y[:, None])
+        full |= self.full_rows[idx]
+        self.full_rows[idx] = full
+        count = full.sum(axis=1)
+        # full row indices first, in ascending order
+        self.full_lines[idx] = np.argsort(~full, axis=1, kind='stable')[:, :4]
+        self.full_line_count[idx] = count
+        self.board[idx] = np.where(full[:, :, None], 5, board)  # mark grey
+
+    def remove_full_line_animation(self, animating):
+        clearing = np.flatnonzero(animating
+                                  & (self.full_line_anim_y < self.full_line_count))
+        idx = np.flatnonzero(animating
+                             & (self.full_line_anim_y >= self.full_line_count))
+        if clearing.size:
+            line_y = self.full_lines[clearing, self.full_line_anim_y[clearing]]
+            self.board[clearing, line_y, self.full_line_anim_x[clearing]] = 0
+            self.full_line_anim_x[clearing] += 1
+            done = clearing[self.full_line_anim_x[clearing] >= BOARD_WIDTH]
+            self.full_line_anim_x[done] = 0
+            self.full_line_anim_y[done] += 1
+            self.add_score(done, self.full_line_score)
+
+        if idx.size:
+            # stable sort puts the kept rows first, cleared rows end on top
+            order = np.argsort(self.full_rows[idx], axis=1, kind='stable')
+            board = self.board[idx[:, None], order]
+            board[ROWS >= BOARD_HEIGHT - self.full_line_count[idx, None]] = 0
+            self.board[idx] = board
+            self.player_control[idx] = ~self.game_over[idx]
+            self.lines[idx] += self.full_line_count[idx]
+            self.full_rows[idx] = False
+            self.full_line_count[idx] = 0
+            self.full_line_anim_x[idx] = 0
+            self.full_line_anim_y[idx] = 0
+
+    def do_game_over_animation(self, over):
+        count = self.game_over_animation_count
+        self.show_game_over_label |= over & (count >= BOARD_WIDTH * BOARD_HEIGHT)
+        idx = np.flatnonzero(over & (count < BOARD_WIDTH * BOARD_HEIGHT))
+        if idx.size:
+            y = count[idx] // BOARD_WIDTH
+            rows = self.board[idx, y]
+            self.board[idx, y] = np.where(rows != 0, 6, rows)  # dark grey
+            count[idx] += BOARD_WIDTH
+
+    def set_game_over(self, idx):
+        self.player_control[idx] = False
+        self.game_over_animation_count[idx] = 0
+        self.game_over[idx] = True
+
+    def check_game_over(self, idx):
+        self.set_game_over(idx[(self.board[idx, -1] != 0).any(axis=1)])
+
+    def add_score(self, idx, points):
+        self.target_score[idx] += points
+        self.points_to_next_level[idx] -= points
+        self.next_level(idx[self.points_to_next_level[idx] <= 0])
+
+    def next_level(self, idx):
+        self.level[idx] += 1
+        self.points_to_next_level[idx] = (self.level_score
+                                          + self.level[idx] * self.level_score_step)
+        self.count_down[idx] = self.fall_time - np.minimum(
+            self.level[idx] * self.fall_time_step,
+            self.fall_time - self.min_fall_time)
+
+    def next_player(self, idx):
+        self.player_x[idx] = 4
+        self.player_y[idx] = 18
+        self.player_shape[idx] = self.next_shape[idx]
+        self.player_rotation[idx] = 0
+        self.player_color[idx] = self.next_color[idx]
+        for i in idx:
+            self.next_shape[i] = self.rngs[i].randint(0, 6)
+            self.next_color[i] = self.rngs[i].randint(1, 4)
+        blocked = idx[self.collides(idx, self.player_x[idx], self.player_y[idx],
+                                    self.player_rotation[idx])]
+        if blocked.size:
+            shape = self.player_shape[blocked]
+            xs = self.player_x[blocked, None] + CELL_X[shape, 0]
+            ys = self.player_y[blocked, None] + CELL_Y[shape, 0]
+            self.board[blocked[:, None], ys, xs] = self.player_color[blocked, None]
+            self.set_game_over(blocked)
+
+
+def benchmark(sizes=(1, 10, 100, 1000, 10000), ticks=2000, seed=0):
+    # games per second of random play, for TetrisEngine and VectorEngine
+    actions = np.random.RandomState(seed)
+    results = []
+
+    game = engine.TetrisEngine(rng=random.Random(seed))
+    games = 0
+    start = time.perf_counter()
+    for action in actions.randint(0, len(engine.ACTIONS), ticks * 10):
+        game.step(action)
+        if game.show_game_over_label:
+            games += 1
+            game.restart()
+    elapsed = time.perf_counter() - start
+    results.append(('TetrisEngine', 1, games / elapsed, ticks * 10 / elapsed))
+
+    for n in sizes:
+        sim = VectorEngine(n, seeds=range(seed, seed + n))
+        start = time.perf_counter()
+        for _ in range(ticks):
+            sim.step(actions.randint(0, len(engine.ACTIONS), n))
+        elapsed = time.perf_counter() - start
+        results.append(('VectorEngine', n, sim.games_finished / elapsed,
+                        n * ticks / elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    print('{:<14}{:>8}{:>14}{:>16}'.format('engine', 'N', 'games/s', 'game steps/s'))
+    for name, n, games, steps in benchmark():
+        print('{:<14}{:>8}{:>14.0f}{:>16.0f}'.format(name, n, games, steps))
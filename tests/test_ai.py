@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from game import ai
+from game.engine import TetrisEngine
+from game.shapes import ROTATIONS
+
+
+class PlacementTest(unittest.TestCase):
+
+    def test_distinct_rotations(self):
+        self.assertEqual([len(pieces) for pieces in ai.DISTINCT_ROTATIONS],
+                         [2, 1, 4, 4, 4, 2, 2])
+
+    def test_distinct_rotations_reach_every_board(self):
+        game = TetrisEngine(seed=2)
+        player = ai.AutoPlayer(lookahead=False)
+        for _ in range(600):
+            game.step(player.act(game))
+        rows = ai.board_rows(game.board)
+        for shape in range(len(ROTATIONS)):
+            every = ai.DISTINCT_ROTATIONS
+            try:
+                ai.DISTINCT_ROTATIONS = [tuple(rotations)
+                                         for rotations in ROTATIONS]
+                expected = set(board for _, _, board, _
+                               in ai.placements(rows, shape))
+            finally:
+                ai.DISTINCT_ROTATIONS = every
+            boards = [board for _, _, board, _ in ai.placements(rows, shape)]
+            self.assertEqual(set(boards), expected)
+            self.assertEqual(len(boards), len(set(boards)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from game import engine
+from game.controls import Controls, InputLatency
+
+TICK = 1.0 / 60.0
+
+
+def run(controls, script, ticks):
+    # script: {tick: [(action, pressed)]}, events arrive before that tick;
+    # returns [(tick, action, press time or None for a repeat)]
+    out = []
+    for tick in range(ticks):
+        for action, pressed in script.get(tick, ()):
+            if pressed:
+                controls.press(action, timestamp=tick)
+            else:
+                controls.release(action, timestamp=tick)
+        for action, timestamp in controls.tick():
+            out.append((tick, action, timestamp))
+    return out
+
+
+class ControlsTest(unittest.TestCase):
+
+    def setUp(self):
+        # 10 ticks of delayed auto-shift, then a repeat every 2 ticks
+        self.controls = Controls(TICK, das=0.167, arr=0.033)
+        self.assertEqual((self.controls.das_ticks, self.controls.arr_ticks),
+                         (10, 2))
+
+    def test_held_move_repeats_after_das_every_arr(self):
+        out = run(self.controls, {0: [(engine.LEFT, True)],
+                                  15: [(engine.LEFT, False)]}, 20)
+        self.assertEqual(out, [(0, engine.LEFT, 0), (10, engine.LEFT, None),
+                               (12, engine.LEFT, None), (14, engine.LEFT, None)])
+
+    def test_os_key_repeat_is_ignored(self):
+        script = dict((tick, [(engine.LEFT, True)]) for tick in range(0, 12, 3))
+        out = run(self.controls, script, 13)
+        self.assertEqual(out, [(0, engine.LEFT, 0), (10, engine.LEFT, None),
+                               (12, engine.LEFT, None)])
+
+    def test_last_pressed_wins(self):
+        out = run(self.controls, {0: [(engine.LEFT, True)],
+                                  5: [(engine.RIGHT, True)]}, 18)
+        self.assertEqual(out, [(0, engine.LEFT, 0), (5, engine.RIGHT, 5),
+                               (15, engine.RIGHT, None),
+                               (17, engine.RIGHT, None)])
+
+    def test_release_hands_over_and_charges_das_again(self):
+        out = run(self.controls, {0: [(engine.LEFT, True)],
+                                  12: [(engine.RIGHT, True)],
+                                  14: [(engine.RIGHT, False)]}, 27)
+        # LEFT repeated at 10, RIGHT took over at 12, and LEFT charges
+        # its full delay again from 14
+        self.assertEqual(out, [(0, engine.LEFT, 0), (10, engine.LEFT, None),
+                               (12, engine.RIGHT, 12),
+                               (24, engine.LEFT, None),
+                               (26, engine.LEFT, None)])
+
+    def test_releasing_a_held_key_behind_keeps_the_charge(self):
+        out = run(self.controls, {0: [(engine.LEFT, True)],
+                                  2: [(engine.RIGHT, True)],
+                                  6: [(engine.LEFT, False)]}, 14)
+        self.assertEqual(out, [(0, engine.LEFT, 0), (2, engine.RIGHT, 2),
+                               (12, engine.RIGHT, None)])
+
+    def test_rotate_and_drop_do_not_repeat(self):
+        out = run(self.controls, {0: [(engine.ROTATE, True),
+                                      (engine.DROP, True)]}, 30)
+        self.assertEqual(out, [(0, engine.ROTATE, 0), (0, engine.DROP, 0)])
+
+    def test_press_and_release_within_one_tick(self):
+        out = run(self.controls, {3: [(engine.DOWN, True),
+                                      (engine.DOWN, False)]}, 20)
+        self.assertEqual(out, [(3, engine.DOWN, 3)])
+
+    def test_reset_forgets_held_keys(self):
+        self.controls.press(engine.LEFT, timestamp=0)
+        self.controls.tick()
+        self.controls.reset()
+        self.assertEqual(run(self.controls, {}, 20), [])
+
+
+class Profiler(object):
+
+    def __init__(self):
+        self.samples = []
+
+    def sample(self, name, seconds):
+        self.samples.append((name, seconds))
+
+
+class InputLatencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = Profiler()
+        self.latency = InputLatency(self.profiler)
+
+    def test_state_then_frame(self):
+        self.latency.queued(1.0)
+        self.latency.queued(1.5)
+        self.latency.applied(now=2.0)
+        self.latency.shown(now=2.25)
+        self.latency.shown(now=3.0)
+        self.assertEqual(self.profiler.samples, [
+            ('input.state', 1.0), ('input.state', 0.5),
+            ('input.frame', 1.25), ('input.frame', 0.75)])
+
+    def test_applied_up_to_acked_seq(self):
+        for seq in (1, 2, 3):
+            self.latency.queued(float(seq), seq)
+        self.latency.applied(2, now=4.0)
+        self.assertEqual(self.profiler.samples,
+                         [('input.state', 3.0), ('input.state', 2.0)])
+        self.latency.applied(2, now=5.0)
+        self.assertEqual(len(self.profiler.samples), 2)
+        self.latency.applied(3, now=5.0)
+        self.assertEqual(self.profiler.samples[-1], ('input.state', 2.0))
+
+    def test_reset_drops_pending_samples(self):
+        self.latency.queued(1.0)
+        self.latency.applied(now=2.0)
+        self.latency.queued(3.0)
+        self.latency.reset()
+        self.latency.applied(now=4.0)
+        self.latency.shown(now=4.0)
+        self.assertEqual(self.profiler.samples, [('input.state', 1.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
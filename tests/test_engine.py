@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+from game import engine
+from game.ai import AutoPlayer
+from game.board import ListBoard
+from game.engine import TetrisEngine
+from game.state import GameState, StateError
+
+try:
+    import numpy as np
+    from game.vector_engine import VectorEngine
+except ImportError:
+    np = None
+
+# random play mostly idles, with drops now and then so pieces pile up and
+# the game ends
+WEIGHTS = (10, 3, 3, 2, 3, 1)
+
+
+def trace(game):
+    return (tuple(game.board.cells()), tuple(game.player_pos),
+            game.player_piece.shape, game.player_piece.rotation,
+            game.next_shape, game.next_color, game.score, game.target_score,
+            game.level, game.lines, game.game_over, game.show_game_over_label)
+
+
+def vector_trace(sim, i):
+    rows, columns = np.nonzero(sim.board[i])
+    cells = tuple(sorted((int(x), int(y), int(sim.board[i, y, x]))
+                         for y, x in zip(rows, columns)))
+    return (cells, (int(sim.player_x[i]), int(sim.player_y[i])),
+            int(sim.player_shape[i]), int(sim.player_rotation[i]),
+            int(sim.next_shape[i]), int(sim.next_color[i]), int(sim.score[i]),
+            int(sim.target_score[i]), int(sim.level[i]), int(sim.lines[i]),
+            bool(sim.game_over[i]), bool(sim.show_game_over_label[i]))
+
+
+def play(game, actions):
+    traces = []
+    for action in actions:
+        game.step(action)
+        traces.append(trace(game))
+    return traces
+
+
+class EquivalenceTest(unittest.TestCase):
+
+    @unittest.skipIf(np is None, 'requires numpy')
+    def test_vector_engine_matches_engine(self):
+        n = 4
+        sim = VectorEngine(n, seeds=range(n), autoreset=False)
+        games = [TetrisEngine(rng=random.Random(i)) for i in range(n)]
+        # the first game is played by the AI, so lines get cleared too
+        player = AutoPlayer(lookahead=False)
+        inputs = random.Random(0)
+        for tick in range(6000):
+            actions = [player.act(games[0])]
+            actions += inputs.choices(engine.ACTIONS, WEIGHTS, k=n - 1)
+            for game, action in zip(games, actions):
+                game.step(action)
+            sim.step(np.array(actions))
+            for i, game in enumerate(games):
+                expected = trace(game)
+                expected = (tuple(sorted(expected[0])),) + expected[1:]
+                self.assertEqual(vector_trace(sim, i), expected,
+                                 'game {} tick {}'.format(i, tick))
+        self.assertGreater(games[0].lines, 0)
+
+    def test_bit_board_matches_list_board(self):
+        games = [TetrisEngine(seed=0),
+                 TetrisEngine(seed=0, board_class=ListBoard)]
+        player = AutoPlayer(lookahead=False)
+        for tick in range(6000):
+            action = player.act(games[0])
+            for game in games:
+                game.step(action)
+            self.assertEqual(trace(games[0])[1:], trace(games[1])[1:])
+            self.assertEqual(sorted(games[0].board.cells()),
+                             sorted(games[1].board.cells()))
+            self.assertEqual(games[0].board.heights, games[1].board.heights)
+        self.assertGreater(games[0].lines, 0)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.game = TetrisEngine(seed=7)
+        player = AutoPlayer(lookahead=False)
+        for _ in range(1500):
+            self.game.step(player.act(self.game))
+        inputs = random.Random(1)
+        self.actions = inputs.choices(engine.ACTIONS, WEIGHTS, k=600)
+
+    def test_restore_replays_same_ticks(self):
+        state = self.game.snapshot()
+        expected = play(self.game, self.actions)
+        self.game.restore(state)
+        self.assertEqual(play(self.game, self.actions), expected)
+        # a snapshot stays valid however often it is restored
+        self.game.restore(state)
+        self.assertEqual(play(self.game, self.actions), expected)
+
+    def test_bytes_round_trip_replays_same_ticks(self):
+        data = self.game.snapshot().to_bytes()
+        expected = play(self.game, self.actions)
+        game = TetrisEngine(seed=99)
+        game.restore(GameState.from_bytes(data))
+        self.assertEqual(play(game, self.actions), expected)
+
+    def test_unserializable_states(self):
+        for seed in (-1, 1 << 64, 'seed'):
+            game = TetrisEngine(seed=seed)
+            with self.assertRaises(StateError):
+                game.snapshot().to_bytes()
+        state = self.game.snapshot()
+        state.full_lines = (0, 1, 2, 3, 4)
+        with self.assertRaises(StateError):
+            state.to_bytes()
+        state = self.game.snapshot()
+        state.score = 1 << 32
+        with self.assertRaises(StateError):
+            state.to_bytes()
+
+
+if __name__ == '__main__':
+    unittest.main()
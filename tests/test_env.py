@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+try:
+    import numpy as np
+    from game.env import ACTION_SPACE, TetrisEnv, VectorEnv
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'requires numpy')
+class VectorEnvTest(unittest.TestCase):
+
+    def run_env(self, seed, actions, steps=200):
+        env = VectorEnv(8, workers=2, seeds=range(8))
+        try:
+            obs, _ = env.reset(seed)
+            actions = np.random.RandomState(0).randint(0, actions, (steps, 8))
+            total = np.zeros(8, dtype=np.int64)
+            for step_actions in actions:
+                obs, rewards, _, _, _ = env.step(step_actions)
+                total += rewards
+            return obs['board'].copy(), obs['score'].copy(), total
+        finally:
+            env.close()
+
+    def test_reset_with_seed(self):
+        board, score, total = self.run_env(5, ACTION_SPACE)
+        again = self.run_env(5, ACTION_SPACE)
+        np.testing.assert_array_equal(board, again[0])
+        np.testing.assert_array_equal(score, again[1])
+        np.testing.assert_array_equal(total, again[2])
+
+    def test_matches_single_game(self):
+        # game i of a VectorEnv reset with seed s is TetrisEnv(s + i)
+        # no drops, so no game ends and restarts from its own stream
+        board, _, total = self.run_env(5, actions=ACTION_SPACE - 1)
+        env = TetrisEnv(seed=7)
+        env.reset(seed=5 + 2)
+        actions = np.random.RandomState(0).randint(0, ACTION_SPACE - 1, (200, 8))
+        reward_sum = 0
+        for step_actions in actions:
+            obs, reward, terminated, _, _ = env.step(step_actions[2])
+            reward_sum += reward
+            self.assertFalse(terminated)
+        np.testing.assert_array_equal(obs['board'], board[2])
+        self.assertEqual(reward_sum, total[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from game.mixer import SilentBackend, SoundMixer
+
+
+class SoundMixerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = SilentBackend()
+        self.mixer = SoundMixer(self.backend, default_limit=2)
+        self.mixer.add('action', 'action.wav', 3)
+        self.mixer.add('anchor', 'anchor.wav')
+
+    def voices(self, name):
+        return self.mixer.effects[name][0]
+
+    def test_voices_per_effect(self):
+        self.assertEqual(len(self.voices('action')), 3)
+        self.assertEqual(len(self.voices('anchor')), 2)
+        self.assertEqual(len(self.backend.voices), 5)
+        self.assertTrue(all(voice.source == 'action.wav'
+                            for voice in self.voices('action')))
+
+    def test_overlapping_sounds_use_free_voices(self):
+        for _ in range(3):
+            self.mixer.play('action')
+        self.assertEqual([voice.triggers for voice in self.voices('action')],
+                         [1, 1, 1])
+        self.assertEqual([voice.triggers for voice in self.voices('anchor')],
+                         [0, 0])
+
+    def test_busy_effect_restarts_its_oldest_voice(self):
+        for _ in range(5):
+            self.mixer.play('action')
+        # the fourth and fifth restarted the first and second voices
+        self.assertEqual([voice.triggers for voice in self.voices('action')],
+                         [2, 2, 1])
+        self.assertEqual(len(self.backend.voices), 5)
+
+    def test_unknown_effect_is_ignored(self):
+        self.mixer.play('level_up')
+        self.assertEqual(sum(voice.triggers for voice in self.backend.voices), 0)
+
+    def test_disabled_mixer_plays_nothing(self):
+        self.mixer.play('anchor')
+        self.mixer.set_enabled(False)
+        self.assertEqual(self.mixer.play, self.mixer.mute)
+        # muting stops what is playing
+        self.assertFalse(any(voice.playing for voice in self.backend.voices))
+        for _ in range(4):
+            self.mixer.play('action')
+            self.mixer.play('anchor')
+        self.assertEqual(sum(voice.triggers for voice in self.backend.voices), 1)
+
+        self.mixer.set_enabled(True)
+        self.mixer.play('action')
+        self.assertEqual(sum(voice.triggers for voice in self.backend.voices), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from game.ai import AutoPlayer
+from game.engine import TetrisEngine
+from game.replay import (Recorder, Replay, ReplayError, read_varint,
+                         write_varint)
+
+
+class ReplayTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # an autoplayed game with the recorder hooked in like the window's
+        cls.game = TetrisEngine(seed=11)
+        recorder = Recorder(cls.game.seed, cls.game.tick)
+        player = AutoPlayer(lookahead=False)
+        # (ticks, target score, cells) after every tick
+        cls.trace = []
+        while not cls.game.show_game_over_label and cls.game.ticks < 20000:
+            action = player.act(cls.game)
+            if action:
+                recorder.record(cls.game.ticks, action)
+            cls.game.step(action)
+            cls.trace.append((cls.game.ticks, cls.game.target_score,
+                              tuple(cls.game.board.cells())))
+        cls.data = recorder.finish(cls.game.ticks, cls.game.target_score)
+
+    def test_round_trip_verifies(self):
+        replay = Replay.from_bytes(self.data)
+        self.assertEqual(replay.seed, self.game.seed)
+        self.assertEqual(replay.end_tick, self.game.ticks)
+        self.assertEqual(replay.score, self.game.target_score)
+        self.assertGreater(replay.score, 0)
+        self.assertTrue(replay.verify())
+
+    def test_seek(self):
+        replay = Replay.from_bytes(self.data)
+        for ticks, score, cells in self.trace[::997]:
+            game = replay.seek(ticks)
+            self.assertEqual(game.ticks, ticks)
+            self.assertEqual(game.target_score, score)
+            self.assertEqual(tuple(game.board.cells()), cells)
+        self.assertEqual(replay.seek(replay.end_tick + 100).ticks,
+                         replay.end_tick)
+
+    def test_truncated_replay(self):
+        # every cut through the header, then a sample of the inputs
+        sizes = list(range(64)) + list(range(64, len(self.data), 61))
+        sizes.append(len(self.data) - 1)
+        for size in sizes:
+            with self.assertRaises(ReplayError):
+                Replay.from_bytes(self.data[:size])
+
+    def test_varint(self):
+        for value in (0, 1, 0x7f, 0x80, 0x3fff, 0x4000, 1 << 40):
+            data = bytearray()
+            write_varint(data, value)
+            self.assertEqual(read_varint(bytes(data) + b'\x05', 0),
+                             (value, len(data)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from game.ai import AutoPlayer
+from game.engine import TetrisEngine
+from game.stream import KEYFRAME, StreamDecoder, StreamEncoder
+
+
+def view(game):
+    return (sorted(game.board.cells()), game.score, game.level,
+            tuple(game.player_pos), game.player_piece, game.next_shape,
+            game.next_color, game.game_over)
+
+
+class StreamTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # an autoplayed game, restarted once it ends; the live view after
+        # every tick next to the frame encoded for it
+        game = TetrisEngine(seed=5)
+        player = AutoPlayer(lookahead=False)
+        encoder = StreamEncoder(keyframe_interval=120)
+        cls.frames = []
+        cls.views = []
+        cls.restarts = 0
+        for _ in range(12000):
+            events = game.step(player.act(game))
+            if game.show_game_over_label:
+                game.restart(cls.restarts)
+                cls.restarts += 1
+            cls.frames.append(encoder.encode(game, events))
+            cls.views.append(view(game))
+
+    def test_decoded_game_matches_every_tick(self):
+        self.assertGreater(self.restarts, 0)
+        decoder = StreamDecoder()
+        for i, frame in enumerate(self.frames):
+            self.assertEqual(decoder.decode(frame), len(frame))
+            self.assertEqual(view(decoder.game), self.views[i], 'tick {}'.format(i))
+
+    def test_join_mid_stream(self):
+        start = 1000
+        decoder = StreamDecoder()
+        synced = None
+        for i in range(start, len(self.frames)):
+            frame = self.frames[i]
+            if synced is None and frame[0] & KEYFRAME:
+                synced = i
+            decoder.decode(frame)
+            if synced is not None:
+                self.assertEqual(view(decoder.game), self.views[i],
+                                 'tick {}'.format(i))
+            else:
+                self.assertFalse(decoder.synced)
+        self.assertIsNotNone(synced)
+        self.assertLessEqual(synced - start, 120)
+
+
+if __name__ == '__main__':
+    unittest.main()